@@ -1,46 +1,290 @@
-import atexit
+import cPickle
+import hashlib
 import os
-import shelve
+import sys
 import tempfile
+import threading
+
+import numpy as np
+import theano
+from theano.compile.pfunc import rebuild_collect_shared
+from theano.compile.sharedvalue import SharedVariable
+from theano.gof import graph
+
+
+def generate_key(*values):
+    """Generate a key from the contents of the given values.
+
+    Arrays (and lists and tuples) are described by their shape
+    and data, anything else by its repr().
+    """
+    h = hashlib.sha1()
+    for value in values:
+        if isinstance(value, (list, tuple, np.ndarray)):
+            value = np.asarray(value, dtype='float64')
+            h.update('a%s%s' % (value.shape, value.tostring()))
+        else:
+            h.update('v%r' % (value,))
+    return h.hexdigest()
 
 
 def generate_ensemble_key(neurons, dimensions, tau_rc, tau_ref, max_rate,
                           intercept, radius, encoders, decoder_noise,
                           eval_points, noise, seed, dt, array_size):
 
-    key = '%d_%d_%g_%g' % (neurons, dimensions, tau_rc, tau_ref)
+    return generate_key(neurons, dimensions, tau_rc, tau_ref, max_rate,
+        intercept, radius, encoders, decoder_noise, eval_points, noise,
+        seed, dt, array_size)
 
-    if type(max_rate) is tuple and len(max_rate) == 2:
-        key += '_%1.1f_%1.1f' % max_rate
-    else:
-        key += '_%08x' % hash(tuple(max_rate))
 
-    if type(intercept) is tuple and len(intercept) == 2:
-        key += '_%g_%g' % intercept
+def get_array(key):
+    path = os.path.join(cache_dir, key + '.npy')
+    try:
+        value = np.load(path, mmap_mode='r')
+    except (IOError, OSError, ValueError):
+        # not cached (or evicted by another process)
+        return None
+    try:
+        # mark as recently used
+        os.utime(path, None)
+    except OSError:
+        # owned by someone else, or evicted since it was loaded
+        pass
+    return value
+
+
+def set_array(key, value):
+    global cache_size
+    path = os.path.join(cache_dir, key + '.npy')
+    write_atomic(path, lambda f: np.save(f, value))
+    with cache_lock:
+        cache_size = evict(path, cache_dir, '.npy', cache_size, 
+                           max_cache_size)
+
+
+def evict(path, directory, suffix, size, max_size):
+    """Count a file just written to a cache directory in the running
+    total of the size of the cache, and evict the least recently used
+    files if the total passes max_size.
+
+    The directory is only listed the first time a file is counted, 
+    and when the total passes max_size; files other processes add 
+    are only counted then.
+
+    :param string path: the file just written
+    :param string directory: the cache directory
+    :param string suffix: the extension of the cached files
+    :param int size: the running total, None if not counted yet
+    :param int max_size: the maximum total size (bytes)
+    :returns: the new running total
+    """
+    if size is None:
+        size = sum(stat[1] for stat in cache_stats(directory, suffix))
     else:
-        key += '_%08x' % hash(tuple(intercept))
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            # not written
+            pass
+    if size <= max_size:
+        return size
 
-    key += '_%g_%g_%g_%d' % (radius, decoder_noise, dt, array_size)
+    # evict the least recently used files until the cache fits
+    stats = cache_stats(directory, suffix)
+    size = sum(stat[1] for stat in stats)
+    for mtime, path_size, path in sorted(stats):
+        if size <= max_size: 
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        size -= path_size
+    return size
 
-    # TODO: use some approach other than hoping that this hash
-    # does not have collisions
-    if encoders is not None:
-        key += '_enc%08x' % hash(tuple([tuple(x) for x in encoders]))
-    if eval_points is not None:
-        key += '_eval%08x' % hash(tuple([tuple(x) for x in eval_points]))
-    if seed is not None:
-        key += '_seed%08x' % seed
 
-    return key
+def cache_stats(directory, suffix):
+    """The time last used, size and path of every cached file."""
+    stats = []
+    for name in os.listdir(directory):
+        if not name.endswith(suffix): continue
+        path = os.path.join(directory, name)
+        try:
+            stats.append((os.path.getmtime(path), os.path.getsize(path), path))
+        except OSError:
+            # evicted by another process
+            pass
+    return stats
 
 
 def get_gamma_inv(key):
-    return cache.get(key, None)
+    Ginv = get_array(key + '_Ginv')
+    A = get_array(key + '_A')
+    if Ginv is None or A is None:
+        return None
+    return Ginv, A
 
 
 def set_gamma_inv(key, value):
-    cache[key] = value
+    Ginv, A = value
+    set_array(key + '_Ginv', Ginv)
+    set_array(key + '_A', A)
+
+
+def write_atomic(path, write):
+    # write to a temporary file first, so that other processes
+    # never see a partially written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.rename(tmp_path, path)
+    except Exception:
+        # couldn't pickle the value (too deep, or not picklable), or 
+        # couldn't replace a file another process already wrote;
+        # carry on without caching it
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def generate_graph_key(updates):
+    """Generate a key describing the structure of a set of theano updates.
+
+    Constants are described by their values, shared variables only by
+    their type and name, so that networks built the same way (but with
+    new shared variables) get the same key. Leaving out the shape of
+    shared variables keeps the key of a network the same when its probe
+    buffers grow; the compiled function doesn't depend on it.
+
+    :param OrderedDict updates: the updates of the theano_tick function
+    """
+    h = hashlib.sha1()
+    h.update('%s_%s_%s_%s_%s' % (sys.version, theano.__version__,
+        theano.config.floatX, theano.config.device, theano.config.mode))
+
+    # number the variables in the order they're first seen
+    index = {}
+    def describe(var):
+        if var not in index:
+            index[var] = len(index)
+            if isinstance(var, graph.Constant):
+                data = np.asarray(var.data)
+                h.update('c%s%s%s' % (var.type, data.shape,
+                    hashlib.sha1(data.tostring()).hexdigest()))
+            elif isinstance(var, SharedVariable):
+                h.update('s%s%s' % (var.type, var.name))
+            elif var.owner is None:
+                h.update('i%s' % var.type)
+        return index[var]
+
+    outputs = [v for pair in updates.items() for v in pair]
+    for node in graph.io_toposort(graph.inputs(outputs), outputs):
+        props = [str(getattr(node.op, p)) 
+                 for p in getattr(node.op, '__props__', ())]
+        h.update('n%s%s%s' % (node.op, props, 
+            [describe(var) for var in node.inputs]))
+        for var in node.outputs:
+            describe(var)
+    h.update('u%s' % [(describe(k), describe(v)) for k, v in updates.items()])
+
+    return h.hexdigest()
+
+
+def is_private_dir(path):
+    """Create the directory if it doesn't exist, so that only the
+    current user can access it, and check that it's owned by the 
+    current user and no one else can write to it.
+
+    Unpickling a file runs arbitrary code, so pickles are only loaded
+    from (and saved to) directories no one else can write to.
+    """
+    try:
+        os.makedirs(path, 0o700)
+    except OSError:
+        # already exists
+        pass
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+        return False
+    return not stat.st_mode & 0o022
+
+
+def get_theano_tick(key, updates):
+    if not is_private_dir(tick_cache_dir):
+        return None
+    # the function was optimized before it was pickled
+    reoptimize = theano.config.reoptimize_unpickled_function
+    theano.config.reoptimize_unpickled_function = False
+    path = os.path.join(tick_cache_dir, key + '.pkl')
+    try:
+        with open(path, 'rb') as f:
+            theano_tick = cPickle.load(f)
+    except Exception:
+        # not cached, or pickled by an incompatible version
+        # (which can fail in any number of ways); recompile
+        return None
+    finally:
+        theano.config.reoptimize_unpickled_function = reoptimize
+    try:
+        # mark as recently used
+        os.utime(path, None)
+    except OSError:
+        pass
+    if theano_tick is None:
+        # theano.config.unpickle_function is off
+        return None
+
+    # the unpickled function has its own copies of the shared variables,
+    # so point the shared variables in updates (found in the same order
+    # theano.function finds them) at the storage of those copies
+    # (theano_tick.copy(swap=...) loses the ordering of inplace operations)
+    shared = rebuild_collect_shared(outputs=[], updates=updates.items(),
+        copy_inputs_over=True)[2][3]
+    unpickled = [i.variable for i in theano_tick.maker.inputs]
+    if [v.type for v in shared] != [v.type for v in unpickled]:
+        return None
+    for var, unpickled_var in zip(shared, unpickled):
+        unpickled_var.container.value = var.get_value(borrow=True)
+        var.container = unpickled_var.container
+    return theano_tick
+
+
+def set_theano_tick(key, theano_tick):
+    if not is_private_dir(tick_cache_dir):
+        return
+    global tick_cache_size
+    path = os.path.join(tick_cache_dir, key + '.pkl')
+    write_atomic(path, 
+        lambda f: cPickle.dump(theano_tick, f, cPickle.HIGHEST_PROTOCOL))
+    # the pickles hold the constants of the graph, weight matrices 
+    # included, so they're evicted like the arrays
+    with cache_lock:
+        tick_cache_size = evict(path, tick_cache_dir, '.pkl', 
+                                tick_cache_size, max_tick_cache_size)
+
+
+# maximum total size of the cached arrays (bytes)
+max_cache_size = 2 ** 30
+# total size of the cached arrays (bytes), 
+# counted when the first array is cached
+cache_size = None
+# maximum and running total size of the pickled functions (bytes)
+max_tick_cache_size = 2 ** 30
+tick_cache_size = None
+# arrays are cached from build()'s threads
+cache_lock = threading.Lock()
 
-cache = shelve.open(os.path.join(tempfile.gettempdir(),
-                                 'nefpy_cache_gamma_inv'))
-atexit.register(cache.close)
+cache_dir = os.path.join(tempfile.gettempdir(), 'nefpy_cache')
+try:
+    os.makedirs(cache_dir)
+except OSError:
+    # already exists
+    pass
+# pickled functions are kept with theano's compiled code, 
+# which is already per-user
+tick_cache_dir = os.path.join(theano.config.compiledir, 'nefpy_theano_tick')
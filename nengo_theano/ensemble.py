@@ -7,7 +7,6 @@ from _collections import OrderedDict
 from . import cache
 from . import ensemble_origin
 from . import filter
-from . import helpers
 from . import neuron
 from . import origin
 
@@ -22,7 +21,8 @@ class Ensemble:
                  max_rate=(200, 300), intercept=(-1.0, 1.0), radius=1.0,
                  encoders=None, seed=None, neuron_type='lif',
                  array_size=1, eval_points=None, decoder_noise=0.1,
-                 noise_type='uniform', noise=None, mode='spiking'):
+                 noise_type='uniform', noise=None, mode='spiking',
+                 decoder_solver='eigh', defer_decoders=False):
         """Construct an ensemble composed of the specific neuron model,
         with the specified neural parameters.
 
@@ -62,6 +62,13 @@ class Ensemble:
             If noise_type = uniform, this is the lower and upper
             bound on the distribution.
             If noise_type = gaussian, this is the variance.
+        :param string decoder_solver:
+            the method used to solve for the decoders of the origins,
+            unless an origin is given its own,
+            options = {'eigh', 'lstsq', 'cholesky'}
+        :param bool defer_decoders:
+            if True, the decoders of the origins are only computed
+            when asked for, see :func:`Network.build()`
 
         """
         if seed is None:
@@ -74,6 +81,8 @@ class Ensemble:
         self.noise = noise
         self.noise_type = noise_type
         self.decoder_noise = decoder_noise
+        self.decoder_solver = decoder_solver
+        self.defer_decoders = defer_decoders
         self.mode = mode
 
         # make sure that eval_points is the right shape
@@ -96,7 +105,13 @@ class Ensemble:
 
         # make dictionary for origins
         self.origin = {}
-        # set up a dictionary for decoded_input
+        # the factored activity matrices of the origins, as (F, A), 
+        # indexed by cache key, see EnsembleOrigin.compute_decoders()
+        self.decoder_data = {}
+        # the cache keys of the activity matrices an origin 
+        # is waiting to compute
+        self.pending_keys = set()
+        # set up a dictionary for decoded_input, indexed by pstc
         self.decoded_input = {}
 
         # if we're creating a spiking ensemble
@@ -125,7 +140,8 @@ class Ensemble:
             self.shared_encoders = theano.shared(self.encoders, 
                 name='ensemble.shared_encoders')
 
-            # set up a dictionary for encoded_input connections
+            # set up a dictionary for encoded_input connections,
+            # indexed by pstc
             self.encoded_input = {}
             # list of learned terminations on ensemble
             self.learned_terminations = []
@@ -173,21 +189,27 @@ class Ensemble:
         elif encoded_input is not None: assert (decoded_input is None) 
         else: assert False
 
+        # the filters are linear, so all the inputs with the same pstc
+        # are summed and share a single filter
         if decoded_input: 
             if self.mode is not 'direct': 
                 # rescale decoded_input by this neuron's radius
                 source = TT.true_div(decoded_input, self.radius)
             # ignore radius in direct mode
             else: source = decoded_input
-            name = helpers.get_unique_name(name, self.decoded_input)
-            self.decoded_input[name] = filter.Filter(
-                name=name, pstc=pstc, source=source, 
-                shape=(self.array_size, self.dimensions))
+            if self.decoded_input.has_key(pstc):
+                self.decoded_input[pstc].add_source(source)
+            else:
+                self.decoded_input[pstc] = filter.Filter(
+                    name=name, pstc=pstc, source=source, 
+                    shape=(self.array_size, self.dimensions))
         elif encoded_input: 
-            name = helpers.get_unique_name(name, self.encoded_input)
-            self.encoded_input[name] = filter.Filter(
-                name=name, pstc=pstc, source=encoded_input, 
-                shape=(self.array_size, self.neurons_num))
+            if self.encoded_input.has_key(pstc):
+                self.encoded_input[pstc].add_source(encoded_input)
+            else:
+                self.encoded_input[pstc] = filter.Filter(
+                    name=name, pstc=pstc, source=encoded_input, 
+                    shape=(self.array_size, self.neurons_num))
 
     def add_learned_termination(self, name, pre, error, pstc, dt,
                                 learned_termination_class=hPESTermination,
@@ -224,16 +246,15 @@ class Ensemble:
         learned_term = learned_termination_class(
             pre=pre, post=self, error=error, **kwargs)
 
-        learn_projections = [TT.dot(
-            pre.neurons.output[learned_term.pre_index(i)],  
-            learned_term.weight_matrix[i % self.array_size].T) / dt 
-            for i in range(self.array_size * pre.array_size)]
-
-        # now want to sum all the output to each of the post ensembles 
-        # going to reshape and sum along the 0 axis
-        learn_output = TT.sum( 
-            TT.reshape(learn_projections, 
-            (pre.array_size, self.array_size, self.neurons_num)), axis=0)
+        # the weight matrix is (pre.array_size * post.array_size x 
+        # post_neurons x pre_neurons), with the post index varying fastest,
+        # so project the spikes of every pre array onto all the post arrays
+        # with one batched dot, and sum the contributions of the pre arrays
+        weight_matrix = TT.reshape(learned_term.weight_matrix, 
+            (pre.array_size, self.array_size * self.neurons_num, 
+             pre.neurons_num))
+        learn_output = TT.sum(TT.batched_dot(
+            weight_matrix, pre.neurons.output), axis=0) / dt
         # reshape to make it (array_size x neurons_num)
         learn_output = TT.reshape(learn_output, 
             (self.array_size, self.neurons_num))
@@ -252,6 +273,8 @@ class Ensemble:
             desired transformation to perform over represented signal
         :param list eval_points:
             specific set of points to optimize decoders over for this origin
+        :param string solver:
+            the method used to solve for the decoders of this origin
         """
 
         # if we're in spiking mode create an ensemble_origin with decoders 
@@ -259,6 +282,8 @@ class Ensemble:
         if self.mode == 'spiking':
             if 'eval_points' not in kwargs.keys():
                 kwargs['eval_points'] = self.eval_points
+            if 'solver' not in kwargs.keys():
+                kwargs['solver'] = self.decoder_solver
             self.origin[name] = ensemble_origin.EnsembleOrigin(
                 ensemble=self, func=func, **kwargs)
 
@@ -360,11 +385,12 @@ class Ensemble:
             # only do this if there is decoded_input
             if X is not None:
                 # add to input current for each neuron as
-                # represented input signal x preferred direction
-
-                for i in range(self.array_size): #len(self.bias)):
-                    J = TT.inc_subtensor(J[i], 
-                        TT.dot(X[i], self.shared_encoders[i].T))
+                # represented input signal x preferred direction,
+                # for all of the sub-populations at once
+                # (array_size x dimensions) . 
+                #     (array_size x dimensions x neurons_num)
+                J += TT.batched_dot(X, 
+                    self.shared_encoders.dimshuffle(0, 2, 1))
 
             # if noise has been specified for this neuron,
             if self.noise: 
@@ -1,4 +1,5 @@
 from _collections import OrderedDict
+import threading
 
 import theano
 from theano import tensor as TT
@@ -10,10 +11,16 @@ from . import cache
 from . import neuron
 from . import lif
 from . import lif_rate
+from . import solvers
 from .origin import Origin
 
+# theano's compilation isn't thread-safe, so the activities of neuron
+# models without a numpy rate equation are simulated one origin at a time
+simulate_lock = threading.Lock()
+
 class EnsembleOrigin(Origin):
-    def __init__(self, ensemble, dt, func=None, eval_points=None):
+    def __init__(self, ensemble, dt, func=None, eval_points=None,
+                 solver='eigh'):
         """The output from a population of neurons (ensemble),
         performing a transformation (func) on the represented value.
 
@@ -22,9 +29,13 @@ class EnsembleOrigin(Origin):
         :param function func:
             the transformation to perform to the ensemble's
             represented values to get the output value
+        :param string solver:
+            the method used to solve for the decoders,
+            options = {'eigh', 'lstsq', 'cholesky'}, see :mod:`solvers`
         
         """
         self.ensemble = ensemble
+        self.solver = solver
         # sets up self.decoders
         func_size = self.compute_decoders(func, dt, eval_points) 
         # decoders is array_size * neurons_num * func_dimensions, 
@@ -32,7 +43,6 @@ class EnsembleOrigin(Origin):
         initial_value = np.zeros(self.ensemble.array_size * func_size) 
         Origin.__init__(self, func=func, initial_value=initial_value)
         self.func_size = func_size
-        self.decoders_shuffled = self.decoders.dimshuffle(0,2,1) 
     
     def compute_decoders(self, func, dt, eval_points=None):     
         """Compute decoding weights.
@@ -45,7 +55,12 @@ class EnsembleOrigin(Origin):
         Decoder values computed as D = (A'A)^-1 A'X_f
         where A is the matrix of activity values of each 
         neuron over sampled X values, and X_f is the vector
-        of desired f(x) values across sampled points.
+        of desired f(x) values across sampled points,
+        with the solver of this origin.
+
+        If the ensemble defers its decoders, the decoders are left 
+        at zero here, until :func:`factor_activities()` and 
+        :func:`solve_decoders()` are called, see :func:`Network.build()`.
 
         :param function func: function to compute with this origin
         :param float dt: timestep for simulating to get A matrix
@@ -54,6 +69,8 @@ class EnsembleOrigin(Origin):
         """
 
         key = self.ensemble.cache_key
+        if self.solver != 'eigh':
+            key = cache.generate_key(key, self.solver)
         if eval_points == None:  
             # generate sample points from state space randomly
             # to minimize decoder error over in decoder calculation
@@ -72,7 +89,7 @@ class EnsembleOrigin(Origin):
             self.num_samples = eval_points.shape[1]
 
             if eval_points is not self.ensemble.eval_points:
-                key += '_eval%08x' % hash(tuple([tuple(x) for x in eval_points]))
+                key = cache.generate_key(key, eval_points)
 
             if eval_points.shape[0] != self.ensemble.dimensions: 
                 raise Exception("Evaluation points must be of the form: " + 
@@ -99,98 +116,137 @@ class EnsembleOrigin(Origin):
             target_values = target_values.T
         eval_points = eval_points.astype('float32')
         
-        # replicate attached population of neurons into array of ensembles,
-        # one ensemble per sample point
+        self.eval_points = eval_points
+        self.target_values = target_values
+        self.dt = dt
+
         # set up matrix to store decoders,
         # should be (array_size * neurons_num * dim_func) 
-        decoders = np.zeros((self.ensemble.array_size,
-                             self.ensemble.neurons_num,
-                             target_values.shape[0]))
+        self.decoders = theano.shared(np.zeros(
+            (self.ensemble.array_size, self.ensemble.neurons_num, 
+             target_values.shape[0]), dtype='float32'), 
+            name='ensemble_origin.decoders')
 
-        for index in range(self.ensemble.array_size): 
-            index_key = key + '_%d'%index
+        # look for the factored activity matrix of each sub-population;
+        # origins with the same eval_points and solver share them, 
+        # kept by the ensemble
+        self.keys = [key + '_%d'%index 
+                     for index in range(self.ensemble.array_size)]
+        self.missing = []
+        for index, index_key in enumerate(self.keys):
+            if index_key in self.ensemble.decoder_data: continue
             data = cache.get_gamma_inv(index_key)
             if data is not None:
-                Ginv, A = data
-            else:
-
-                if self.ensemble.neurons.__class__ == lif.LIFNeuron or \
-                    self.ensemeble.neurons.__class__ == lif_rate.LIFRateNeurons:
-
-                    # compute the input current for every neuron and every sample point
-                    J = np.dot(self.ensemble.encoders[index], eval_points)
-                    J += self.ensemble.bias[index][:, np.newaxis]
-
-                    # set up denominator of LIF firing rate equation
-                    A = self.ensemble.neurons.tau_ref - self.ensemble.neurons.tau_rc * \
-                        np.log(1 - 1.0 / np.maximum(J, 0))
-                    
-                    # if input current is enough to make neuron spike,
-                    # calculate firing rate, else return 0
-                    A = np.where(J > 1, 1 / A, 0)
-
-                else:
-                    ## This is a generic method for generating an activity matrix
-                    ## for any type of neuron model. 
-
-                    # compute the input current for every neuron and every sample point
-                    J = TT.dot(self.ensemble.encoders[index], eval_points)
-                    J += self.ensemble.bias[index][:, np.newaxis]
-
-                    # so in parallel we can calculate the activity
-                    # of all of the neurons at each sample point 
-                    neurons = self.ensemble.neurons.__class__(
-                        size=(self.ensemble.neurons_num, self.num_samples), 
-                        tau_rc=self.ensemble.neurons.tau_rc,
-                        tau_ref=self.ensemble.neurons.tau_ref)
-
-                    # run the neuron model for 1 second,
-                    # accumulating spikes to get a spike rate
-                    #TODO: is this long enough? Should it be less?
-                    # If we do less, we may get a good noise approximation!
-                    A = neuron.accumulate(J=J, neurons=neurons, dt=dt, 
-                        time=dt*200, init_time=dt*20)
-
-                # add noise to elements of A
-                # std_dev = max firing rate of population * .1
-                noise = .1 # from Nengo
-                A += noise * np.random.normal(
-                    size=(self.ensemble.neurons_num, self.num_samples), 
-                    scale=(self.ensemble.max_rate[1]))
-
-                # compute Gamma and Upsilon
-                G = np.dot(A, A.T) # correlation matrix
-                
-                #TODO: optimize this so we're not doing
-                # the full eigenvalue decomposition
-                #TODO: add NxS method for large N?
-                #TODO: compare below with pinv rcond
-                
-                #TODO: check the decoder_noise math, and maybe add on to the
-                #      diagonal of G?
-
-                # eigh for symmetric matrices, returns
-                # evalues w and normalized evectors v
-                w, v = np.linalg.eigh(G)
-
-                dnoise = self.ensemble.decoder_noise * \
-                    self.ensemble.decoder_noise
-
-                # formerly 0.1 * 0.1 * max(w), set threshold
-                limit = dnoise * max(w) 
-                v_we_want = np.float32(v[:, w >= limit] / np.sqrt(w[w >= limit]))
-                Ginv = np.dot(v_we_want, v_we_want.T)
-                
-                cache.set_gamma_inv(index_key, (Ginv, A))
-
-            U = np.dot(np.float32(A), np.float32(target_values.T))
-            
+                self.ensemble.decoder_data[index_key] = data
+            # unless another origin is going to compute it 
+            elif index_key not in self.ensemble.pending_keys:
+                self.missing.append(index)
+                self.ensemble.pending_keys.add(index_key)
+
+        # draw the seed of the noise added to the activity matrices 
+        # now, so the random numbers don't depend on when they're 
+        # computed, without holding on to the noise until then
+        self.noise_seed = None
+        if len(self.missing) > 0:
+            self.noise_seed = np.random.randint(1 << 30)
+
+        self.pending = True
+        if not self.ensemble.defer_decoders:
+            self.factor_activities()
+            self.solve_decoders()
+        return target_values.shape[0]
+
+    def factor_activities(self):
+        """Compute and factor the activity matrices of the 
+        sub-populations this origin is the first to need,
+        for all of those sub-populations at once.
+
+        The origins of different ensembles can be factored in 
+        separate threads. For LIF and LIF rate neurons only numpy 
+        calls and the on-disk cache are used; other neuron models are 
+        simulated with theano functions, compiled and run under 
+        simulate_lock, so only their factoring runs in parallel.
+        """
+        if len(self.missing) > 0:
+            A_missing = self.compute_activities(
+                self.missing, self.eval_points, self.dt)
+            # add noise to elements of A
+            # std_dev = max firing rate of population * .1
+            noise = .1 # from Nengo
+            A_missing += noise * np.random.RandomState(
+                self.noise_seed).normal(size=A_missing.shape, 
+                                        scale=self.ensemble.max_rate[1])
+
+            solver = solvers.types[self.solver]
+            for index, A in zip(self.missing, A_missing):
+                index_key = self.keys[index]
+                # factor the activity matrix
+                F = solver.factor(A, self.ensemble.decoder_noise)
+                cache.set_gamma_inv(index_key, (F, A))
+                self.ensemble.decoder_data[index_key] = (F, A)
+                self.ensemble.pending_keys.discard(index_key)
+
+        self.missing = []
+        self.noise_seed = None
+
+    def solve_decoders(self):
+        """Solve for the decoders with the factored activity matrices,
+        once they've all been computed.
+        """
+        solver = solvers.types[self.solver]
+        decoders = np.zeros(self.decoders.get_value().shape)
+        for index, index_key in enumerate(self.keys):
+            F, A = self.ensemble.decoder_data[index_key]
             # compute decoders - least squares method 
-            decoders[index] = np.dot(np.float32(Ginv), np.float32(U))
+            decoders[index] = solver.solve(F, A, self.target_values)
 
-        self.decoders = theano.shared(decoders.astype('float32'), 
-            name='ensemble_origin.decoders')
-        return target_values.shape[0]
+        self.decoders.set_value(decoders.astype('float32'))
+        self.pending = False
+
+    def compute_activities(self, indices, eval_points, dt):
+        """Compute the activity of the neurons of the given 
+        sub-populations at every sample point, for all of the
+        sub-populations at once.
+
+        :param list indices: the indices of the sub-populations
+        :param array eval_points: the (dimensions x samples) sample points
+        :param float dt: timestep for simulating to get A matrix
+        :returns: a (len(indices) x neurons_num x samples) array
+        """
+        # compute the input current for every neuron and every sample point,
+        # (indices x neurons_num x dimensions) . (dimensions x samples)
+        J = np.dot(self.ensemble.encoders[indices], eval_points)
+        J += self.ensemble.bias[indices][:, :, np.newaxis]
+
+        if self.ensemble.neurons.__class__ in (
+                lif.LIFNeuron, lif_rate.LIFRateNeuron):
+
+            # set up denominator of LIF firing rate equation
+            A = self.ensemble.neurons.tau_ref - \
+                self.ensemble.neurons.tau_rc * \
+                np.log(1 - 1.0 / np.maximum(J, 0))
+            
+            # if input current is enough to make neuron spike,
+            # calculate firing rate, else return 0
+            return np.where(J > 1, 1 / A, 0)
+
+        ## This is a generic method for generating an activity matrix
+        ## for any type of neuron model. 
+
+        # so in parallel we can calculate the activity of all 
+        # of the neurons of all the sub-populations at each sample point 
+        neurons = self.ensemble.neurons.__class__(
+            size=J.shape, 
+            tau_rc=self.ensemble.neurons.tau_rc,
+            tau_ref=self.ensemble.neurons.tau_ref)
+
+        # run the neuron model for 1 second,
+        # accumulating spikes to get a spike rate
+        #TODO: is this long enough? Should it be less?
+        # If we do less, we may get a good noise approximation!
+        with simulate_lock:
+            return neuron.accumulate(J=J, neurons=neurons, dt=dt, 
+                time=dt*200, init_time=dt*20)
 
     def make_samples(self):
         """Generate sample points uniformly distributed within the sphere.
@@ -229,9 +285,12 @@ class EnsembleOrigin(Origin):
         # to put us back in the right range
         r = self.ensemble.radius
 
-        z = TT.zeros((self.ensemble.array_size, self.func_size), dtype='float32')
-        for i in range(self.ensemble.array_size):
-            z = TT.set_subtensor(z[i], r / dt * TT.dot(spikes[i], 
-                self.decoders_shuffled[i].T)) 
+        # decode all of the sub-populations at once, 
+        # (array_size x neurons_num) . (array_size x neurons_num x func_size)
+        # gives the (array_size x func_size) decoded output
+        z = TT.batched_dot(spikes, self.decoders)
+        z = TT.cast(r / dt, 'float32') * z
 
-        return OrderedDict({self.decoded_output: TT.flatten(z)})
+        # spikes can be broadcastable along array_size = 1
+        return OrderedDict({self.decoded_output: 
+            TT.unbroadcast(TT.flatten(z), 0)})
@@ -34,6 +34,13 @@ class Filter:
         self.value = theano.shared(value, name=name)
         self.name = name
 
+    def add_source(self, source):
+        """Add another input to be filtered along with the current source.
+
+        :param source: theano object of the same shape as the filter
+        """
+        self.source = self.source + source
+
     def update(self, dt):
         """
         :param float dt: the timestep of the update
@@ -44,4 +51,6 @@ class Filter:
             return OrderedDict([(self.value, value_new.astype('float32'))])
         else:
             ### no filtering, so just make the value the source
-            return OrderedDict([(self.value, self.source.astype('float32'))])
+            value_new = TT.patternbroadcast(self.source.astype('float32'),
+                                            self.value.broadcastable)
+            return OrderedDict([(self.value, value_new)])
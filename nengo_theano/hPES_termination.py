@@ -3,6 +3,7 @@ from _collections import OrderedDict
 import numpy as np
 import theano
 import theano.tensor as TT
+from theano.ifelse import ifelse
 
 from . import neuron
 from .learned_termination import LearnedTermination
@@ -21,10 +22,21 @@ class hPESTermination(LearnedTermination):
 
     def __init__(self, *args, **kwargs):
         """
+        :param int learn_interval:
+            if > 1, the weights are only updated every learn_interval 
+            time steps, each time by the sum of the updates of the
+            time steps since the last one
+        :param float activity_threshold:
+            if not None, only the weights from pre neurons with filtered
+            activity above activity_threshold at some point since the
+            last update are updated, rather than rewriting the whole 
+            weight matrix
         """
         if kwargs.has_key('supervision_ratio'):
             self.supervision_rate = kwargs['supervision_ratio']
             del kwargs['supervision_ratio']
+        self.learn_interval = kwargs.pop('learn_interval', 1)
+        self.activity_threshold = kwargs.pop('activity_threshold', None)
 
         super(hPESTermination, self).__init__(*args, **kwargs)
 
@@ -51,67 +63,141 @@ class hPESTermination(LearnedTermination):
         self.post_filtered = theano.shared(
             self.post_spikes.get_value(), name='hPES.post_filtered')
 
+        # counts the time steps until the next weight update
+        self.step = theano.shared(np.int32(0), name='hPES.step')
+        # the post- and pre-synaptic factors of the updates of each
+        # time step since the last weight update
+        self.post_deltas = theano.shared(np.zeros(
+            (self.learn_interval, self.post.array_size, 
+             self.post.neurons_num), dtype='float32'), 
+            name='hPES.post_deltas')
+        self.pre_traces = theano.shared(np.zeros(
+            (self.learn_interval, self.pre.array_size, 
+             self.pre.neurons_num), dtype='float32'), 
+            name='hPES.pre_traces')
+
     def reset(self):
         """
         """
         super(hPESTermination, self).reset()
         self.theta.set_value(self.initial_theta)
+        self.step.set_value(np.int32(0))
+        self.post_deltas.set_value(
+            np.zeros_like(self.post_deltas.get_value()))
+        self.pre_traces.set_value(
+            np.zeros_like(self.pre_traces.get_value()))
 
     def learn(self):
         """
         """
+        if self.learn_interval > 1 or self.activity_threshold is not None:
+            return self.learn_events()
+
+        # the weight matrix is (pre.array_size * post.array_size x 
+        # post_neurons x pre_neurons), with the post index varying fastest,
+        # so take the outer product of every pre and post array at once as
+        # (pre.array_size x post.array_size x post_neurons x pre_neurons)
+        delta = (self.post_delta().dimshuffle('x', 0, 1, 'x') * 
+                 self.pre_filtered.dimshuffle(0, 'x', 'x', 1))
+        delta = TT.reshape(delta, self.weight_matrix.shape)
+
+        new_wm = self.weight_matrix + delta
+
+        return new_wm
+
+    def record_traces(self):
+        """Record the post- and pre-synaptic factors of this time step's
+        update in the row of the step since the last weight update.
+
+        :returns: the new values of post_deltas and pre_traces
+        """
+        return (TT.set_subtensor(self.post_deltas[self.step], 
+                    TT.cast(self.post_delta(), 'float32')),
+                TT.set_subtensor(self.pre_traces[self.step], 
+                    TT.cast(self.pre_filtered, 'float32')))
+
+    def learn_events(self):
+        """Update the weights every learn_interval time steps,
+        by the sum of the updates of the time steps since the last 
+        weight update, and only the weights from the active pre neurons.
+
+        The updates of the time steps in between are kept as the post
+        and pre factors of their outer products, so recording one costs
+        a row of each, and the sum is one (post x steps) . (steps x pre)
+        dot. The weights from the active pre neurons are incremented in
+        place at their flattened indices, so the cost of an update 
+        scales with the number of active pre neurons. On the steps in
+        between, the weight update is skipped by a lazy ifelse.
+        """
+        post_deltas, pre_traces = self.record_traces()
+
+        post_num = self.post.array_size * self.post.neurons_num
+        # (steps x post.array_size * post_neurons)
+        post_deltas = TT.reshape(post_deltas, (self.learn_interval, post_num))
+
+        if self.activity_threshold is None:
+            # (post.array_size * post_neurons x pre.array_size * pre_neurons)
+            delta = TT.dot(post_deltas.T, TT.reshape(pre_traces, 
+                (self.learn_interval, 
+                 self.pre.array_size * self.pre.neurons_num)))
+            # to (pre.array_size x post.array_size * post_neurons x 
+            # pre_neurons), the layout of the weight matrix
+            delta = TT.reshape(delta, (post_num, self.pre.array_size, 
+                self.pre.neurons_num)).dimshuffle(1, 0, 2)
+            new_wm = self.weight_matrix + TT.reshape(
+                delta, self.weight_matrix.shape)
+        else:
+            # the pre array and neuron index of every pre neuron 
+            # active at some point since the last weight update
+            active = TT.max(pre_traces, axis=0) > self.activity_threshold
+            pre_index, neuron_index = TT.nonzero(active)
+
+            # the index of the weight from every post neuron to every 
+            # active pre neuron, into the flattened (pre.array_size x 
+            # post.array_size x post_neurons x pre_neurons) weight matrix
+            index = ((pre_index * post_num).dimshuffle('x', 0) + 
+                     TT.arange(post_num).dimshuffle(0, 'x')) * \
+                     self.pre.neurons_num + neuron_index.dimshuffle('x', 0)
+            # (post.array_size * post_neurons x active pre neurons)
+            delta = TT.dot(post_deltas.T, 
+                           pre_traces[:, pre_index, neuron_index])
+
+            new_wm = TT.reshape(TT.inc_subtensor(
+                TT.flatten(self.weight_matrix)[TT.flatten(index)], 
+                TT.flatten(delta)), self.weight_matrix.shape)
+
+        if self.learn_interval > 1:
+            # only update the weights on the last step of the interval
+            new_wm = ifelse(TT.eq(self.step, self.learn_interval - 1), 
+                            new_wm, self.weight_matrix)
+        return new_wm
+
+    def post_delta(self):
+        """The post-synaptic factor of the weight update,
+        combining the supervised and unsupervised learning rules.
+
+        :returns: a (post.array_size x post_neurons) theano matrix
+        """
         # get the error as represented by the post neurons
         # should be a vector, (post_neurons x error.dimensions)
         encoded_error = TT.sum(self.encoders * TT.reshape( self.error_value, 
             (self.post.array_size, 1, self.post.dimensions)) , axis=-1)
 
-        supervised_rate = self.learning_rate
-        #TODO: more efficient rewrite with theano batch command? 
-        # this will be a matrix, same size as the connection weight matrix
-        delta_supervised = [
-            encoded_error[i % self.post.array_size][:,None] * 
-            supervised_rate * self.pre_filtered[self.pre_index(i)][None,:]
-            for i in range(self.post.array_size * self.pre.array_size) ]
+        # filtered post activity, scaled by how far it is above theta
+        # should be a matrix, (post.array_size x post_neurons)
+        encoded_activity = (self.post_filtered * 
+            (self.post_filtered - self.theta) * self.gains)
 
+        supervised_rate = self.learning_rate
         unsupervised_rate = TT.cast(
             self.learning_rate * self.scaling_factor, dtype='float32')
-        #TODO: more efficient rewrite with theano batch command? 
-        # this will be a matrix, same size as the connection weight matrix
-        delta_unsupervised = [
-            ( 
-                self.post_filtered[i % self.post.array_size] * 
-                ( 
-                    self.post_filtered[i % self.post.array_size] - 
-                    self.theta[i % self.post.array_size] 
-                ) * 
-                self.gains[i % self.post.array_size] 
-            )[:,None]
-            * unsupervised_rate * self.pre_filtered[self.pre_index(i)][None,:]
-            for i in range(self.post.array_size * self.pre.array_size) ]
-
-        new_wm = (self.weight_matrix
-                + TT.cast(self.supervision_ratio, 'float32') * delta_supervised
-                + TT.cast(1. - self.supervision_ratio, 'float32')
-                * delta_unsupervised)
+        # both learning rules scale the same pre activities, 
+        # so combine them on the post side first
+        return (TT.cast(self.supervision_ratio, 'float32') * 
+                supervised_rate * encoded_error + 
+                TT.cast(1. - self.supervision_ratio, 'float32') * 
+                unsupervised_rate * encoded_activity)
 
-        return new_wm
-
-    def pre_index(self, i): 
-        """This method calculates the index of the pre-synaptic ensemble
-        that should be accessed given a current index value i
-
-        int(np.ceil((i + 1) / float(self.post.array_size)) - 1)
-        generates 0 post.array_size times, then 1 post.array_size times, 
-        then 2 post.array_size times, etc so with 
-        pre.array_size = post.array_size = 2 we're connecting it up in order 
-        [pre[0]-post[0], pre[0]-post[1], pre[1]-post[0], pre[1]-post[1]]
-
-        :param int i: the current index value, 
-            value from 0 to post.array_size * pre.array_size
-        :returns: the desired pre-synaptic ensemble index
-        """
-        return int(np.ceil((i + 1) / float(self.post.array_size)) - 1)
-        
     def update(self, dt):
         """
         """
@@ -126,9 +212,15 @@ class hPESTermination(LearnedTermination):
         alpha = TT.cast(dt / self.theta_tau, dtype='float32')
         new_theta = self.theta + alpha * (new_post - self.theta)
 
-        return OrderedDict({
-                self.weight_matrix: self.learn(),
-                self.pre_filtered: new_pre, 
-                self.post_filtered: new_post,
-                self.theta: new_theta,
-                })
+        updates = OrderedDict([
+                (self.weight_matrix, self.learn()),
+                (self.pre_filtered, new_pre), 
+                (self.post_filtered, new_post),
+                (self.theta, new_theta),
+                (self.step, (self.step + 1) % self.learn_interval),
+                ])
+        if self.learn_interval > 1 or self.activity_threshold is not None:
+            post_deltas, pre_traces = self.record_traces()
+            updates[self.post_deltas] = post_deltas
+            updates[self.pre_traces] = pre_traces
+        return updates
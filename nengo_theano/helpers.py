@@ -65,6 +65,30 @@ def compute_transform(dim_pre, dim_post, array_size, weight=1,
     return transform
 
 
+def low_rank_factors(weight_matrix, tol):
+    """Helper function used by :func:`nef.Network.connect_neurons()` to
+    factor a weight matrix with its truncated singular value decomposition.
+
+    :param weight_matrix: the 2-D weight matrix to factor
+    :param float tol:
+        singular values smaller than tol times the largest are dropped
+    :returns:
+        (U, V) with U . V approximating weight_matrix, or None if the
+        factors have more elements than the weight matrix itself
+
+    """
+    U, s, V = np.linalg.svd(weight_matrix, full_matrices=False)
+    rank = max(np.sum(s > tol * s[0]), 1)
+
+    # only worth it if multiplying by the factors is cheaper
+    rows, cols = weight_matrix.shape
+    if rank * (rows + cols) >= rows * cols:
+        return None
+
+    return ((U[:, :rank] * s[:rank]).astype('float32'), 
+            V[:rank].astype('float32'))
+
+
 def get_unique_name(name, dic):
     """A helper function that runs through a dictionary
     and checks for the key name, adds a digit to the end
@@ -1,4 +1,5 @@
 from numbers import Number
+import collections
 
 import theano
 from theano import tensor as TT
@@ -13,13 +14,25 @@ class Input(object):
     Any callable can be used an input function.
 
     """
-    def __init__(self, name, values, zero_after_time=None):
+    def __init__(self, name, values, zero_after_time=None, step=None,
+                 vectorized=False):
         """
         :param string name: name of the function input
         :param value: defines the output decoded_output
         :type value: float or function
         :param float zero_after_time:
             time after which to set function output = 0 (s)
+        :param step: 
+            the network's time step counter; if given, the output of
+            an Input that isn't a function is looked up inside the
+            theano function, and the Input doesn't need to be ticked
+        :type step: theano shared variable
+        :param bool vectorized:
+            if True, *values* is a function that can be called with an
+            array of times, and returns an array of (times x dimensions)
+            values; it's called before each run for all of the time 
+            steps of the run, and with a step counter given, the output
+            is looked up inside the theano function as well
         
         """
         self.name = name
@@ -29,6 +42,11 @@ class Input(object):
         self.zeroed = False
         self.change_time = None
         self.origin = {}
+        self.step = step
+        self.schedule = None
+        # the output of a vectorized function at every time step
+        self.table = None
+        self.dt = None
 
         # if value parameter is a python function
         if callable(values): 
@@ -37,26 +55,125 @@ class Input(object):
         elif isinstance(values, dict):
             self.change_time = sorted(values.keys())[0]
             # check for size of dict elements
-            if isinstance(values[self.change_time], list):
-                initial_value = np.zeros(len(values[self.change_time]))
-            else: initial_value = np.zeros(1)
+            initial_value = np.zeros(np.size(values[self.change_time]))
             self.origin['X'] = origin.Origin(func=None, 
                 initial_value=initial_value)
             self.values = values
         else:
             self.origin['X'] = origin.Origin(func=None, initial_value=values)
 
+        # the output of a constant Input changes when it's zeroed, 
+        # or when it's a dict of time:value pairs
+        changes = not callable(values) and (
+            self.change_time is not None or zero_after_time is not None)
+        if changes and step is not None:
+            self.make_schedule()
+            # start out with the value at time 0
+            times, table = self.schedule
+            self.origin['X'].decoded_output.set_value(table[
+                np.sum(times.get_value() < 0)])
+
+        if vectorized and step is not None:
+            assert callable(values)
+            self.table = theano.shared(
+                np.zeros((0, self.origin['X'].dimensions), dtype='float32'),
+                name='input.table')
+
+        # whether theano_tick() has anything to do
+        self.needs_tick = (callable(values) and self.table is None) or (
+            changes and self.schedule is None)
+
+    def make_schedule(self):
+        """Precompute the output as a table of values, and the times
+        after which each of them is output, to look it up from the time
+        inside the theano function.
+
+        The first row of the table is the value before the first change.
+        """
+        dimensions = self.origin['X'].dimensions
+        initial_value = self.origin['X'].decoded_output.get_value()
+        times, table = [], [initial_value]
+        if self.change_time is not None:
+            for change_time in sorted(self.values.keys()):
+                times.append(change_time)
+                table.append(np.reshape(
+                    self.values[change_time], dimensions))
+        if self.zero_after_time is not None:
+            # zeroing overrides the changes that come after it
+            keep = np.searchsorted(times, self.zero_after_time)
+            times = times[:keep] + [self.zero_after_time]
+            table = table[:keep + 1] + [np.zeros(dimensions)]
+
+        self.schedule = (
+            theano.shared(np.array(times, dtype='float64'),
+                name='input.schedule_times'),
+            theano.shared(np.array(table, dtype='float32'),
+                name='input.schedule_values'))
+
+    def reserve(self, t):
+        """Evaluate the function for all the time steps up to time t,
+        that it hasn't been evaluated for yet, called by the network 
+        before a run.
+
+        :param float t: the time at which the run ends
+        """
+        if self.table is None:
+            return
+        # the update of the last time step looks one step ahead
+        steps = int(t / self.dt) + 2
+        table = self.table.get_value(borrow=True)
+        if steps <= len(table):
+            return
+
+        times = np.arange(len(table), steps) * self.dt
+        values = np.reshape(self.origin['X'].func(times), 
+                            (len(times), self.origin['X'].dimensions))
+        if self.zero_after_time is not None:
+            values = np.where((times > self.zero_after_time)[:, None], 
+                              0, values)
+        self.table.set_value(np.vstack([table, np.float32(values)]), 
+                             borrow=True)
+
     def reset(self):
         """Resets the function output state values.
         
         """
         self.zeroed = False
 
+    def tick_steps(self, t):
+        """Find the time steps at which the function output changes.
+
+        :param array t: the times of the upcoming time steps
+        :returns: the indices into *t* at which theano_tick() must be called
+        """
+        if self.zeroed or not self.needs_tick:
+            return []
+
+        # a python function has to be called every time step
+        if self.origin['X'].func is not None:
+            return range(len(t))
+
+        steps = []
+        # zero output
+        if self.zero_after_time is not None:
+            steps.append(np.searchsorted(t, self.zero_after_time, 'right'))
+
+        # change value, at most one change happens per time step
+        if self.change_time is not None:
+            step = -1
+            for change_time in sorted(self.values.keys()):
+                if change_time < self.change_time: continue
+                step = max(step + 1, 
+                    np.searchsorted(t, change_time, 'right'))
+                steps.append(step)
+
+        return [s for s in steps if s < len(t)]
+
     def theano_tick(self):
         """Move function input forward in time.
         
         """
-        if self.zeroed:
+        if self.zeroed or not self.needs_tick:
             return
 
         # zero output
@@ -85,3 +202,23 @@ class Input(object):
             # cast as float32 for consistency / speed,
             # but _after_ it's been made a list
             self.origin['X'].decoded_output.set_value(np.float32(values)) 
+
+    def update(self, dt):
+        """Look up the output of the next time step in the schedule,
+        or in the table of function values.
+
+        :param float dt: the timestep of the update
+        """
+        self.dt = dt
+        if self.table is not None:
+            return collections.OrderedDict([
+                (self.origin['X'].decoded_output, self.table[self.step + 1])])
+        if self.schedule is None:
+            return {}
+        times, table = self.schedule
+        # the time of the next time step, which the update is for
+        t = TT.cast(self.step + 1, 'float64') * np.float64(dt)
+        # the number of changes that happened before it
+        index = TT.sum(TT.lt(times, t))
+        return collections.OrderedDict([
+            (self.origin['X'].decoded_output, table[index])])
@@ -7,6 +7,8 @@ from theano import tensor as TT
 import neuron
 
 class LIFNeuron(neuron.Neuron):
+    spiking = True
+
     def __init__(self, size, tau_rc=0.02, tau_ref=0.002):
         """Constructor for a set of LIF rate neuron.
 
@@ -95,10 +97,106 @@ class LIFNeuron(neuron.Neuron):
         # (including setting a neuron that spikes to a voltage of 0)
         # important that it's ordered, due to theano memory optimizations
 
-        return collections.OrderedDict({
-                self.voltage: (v * (1 - spiked)).astype('float32'),
-                self.refractory_time: new_refractory_time.astype('float32'),
-                self.output: spiked.astype('float32'),
-                })
+        return collections.OrderedDict([
+                (self.voltage, (v * (1 - spiked)).astype('float32')),
+                (self.refractory_time, new_refractory_time.astype('float32')),
+                (self.output, spiked.astype('float32')),
+                ])
 
 neuron.types['lif'] = LIFNeuron
+
+
+class LIFNeuronView(object):
+    spiking = True
+
+    def __init__(self, neurons):
+        """Stands in for a LIFNeuron that is simulated as part of a
+        PackedLIFNeuron, collecting its input current.
+
+        :param LIFNeuron neurons: the neurons being packed
+
+        """
+        self.neurons = neurons
+        self.size = neurons.size
+        self.tau_rc = neurons.tau_rc
+        self.tau_ref = neurons.tau_ref
+        self.output = neurons.output
+        self.J = None
+        # placeholder for the new output, until the packed update is made
+        self.spiked = neurons.output.type()
+
+    def update(self, J, dt):
+        """Store the input current for the packed update, 
+        and return the placeholder for the new output.
+
+        :param float array J:
+            the input current for the current time step
+        :param float dt: the timestep of the update
+        """
+        self.J = J
+        return collections.OrderedDict([(self.output, self.spiked)])
+
+
+class PackedLIFNeuron(LIFNeuron):
+    def __init__(self, neurons):
+        """A set of LIFNeurons with the same tau_rc and tau_ref, 
+        simulated as one population with one contiguous state buffer.
+
+        The packed neurons are replaced by LIFNeuronViews while the
+        updates are made, see :func:`pack_updates()`.
+
+        :param list neurons: the LIFNeurons to pack together
+
+        """
+        self.neurons = neurons
+        self.views = [LIFNeuronView(n) for n in neurons]
+        self.sizes = [int(np.prod(n.size)) for n in neurons]
+        LIFNeuron.__init__(self, size=sum(self.sizes), 
+            tau_rc=neurons[0].tau_rc, tau_ref=neurons[0].tau_ref)
+
+        # start from the current state of the packed neurons
+        self.voltage.set_value(np.hstack(
+            [n.voltage.get_value().flatten() for n in neurons]))
+        self.refractory_time.set_value(np.hstack(
+            [n.refractory_time.get_value().flatten() for n in neurons]))
+
+    def unpack(self):
+        """Copy the packed state back into the packed neurons."""
+        voltage = self.voltage.get_value()
+        refractory_time = self.refractory_time.get_value()
+        offset = 0
+        for n, size in zip(self.neurons, self.sizes):
+            n.voltage.set_value(
+                voltage[offset:offset + size].reshape(n.size))
+            n.refractory_time.set_value(
+                refractory_time[offset:offset + size].reshape(n.size))
+            offset += size
+
+    def pack_updates(self, updates, dt):
+        """Replace the updates of the packed neurons with a single
+        update of the packed population.
+
+        Returns the updates with the output of the packed neurons
+        taken from slices of the packed population's output.
+
+        :param OrderedDict updates: updates made with the LIFNeuronViews
+        :param float dt: the timestep of the update
+        """
+        J = TT.concatenate([TT.flatten(view.J) for view in self.views])
+        packed = self.update(J, dt)
+
+        # the new output of each packed neuron is a slice of the new output
+        replace = {}
+        offset = 0
+        for view, size in zip(self.views, self.sizes):
+            spiked = TT.reshape(
+                packed[self.output][offset:offset + size], view.size)
+            replace[view.spiked] = TT.patternbroadcast(
+                spiked, view.output.broadcastable)
+            offset += size
+
+        values = theano.clone(updates.values(), replace=replace)
+        updates = collections.OrderedDict(zip(updates.keys(), values))
+        updates[self.voltage] = packed[self.voltage]
+        updates[self.refractory_time] = packed[self.refractory_time]
+        return updates
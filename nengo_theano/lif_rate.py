@@ -1,5 +1,6 @@
 from _collections import OrderedDict
 
+import numpy as np
 import theano
 from theano import tensor as TT
 
@@ -29,11 +30,11 @@ class LIFRateNeuron(neuron.Neuron):
         :param float array intercepts: x-intercepts of neurons
         
         """
-        x = 1.0 / (1 - TT.exp(
+        x = 1.0 / (1 - np.exp(
                 (self.tau_ref - (1.0 / max_rates)) / self.tau_rc))
-        alpha = (1 - z2) / (intercepts - 1.0)
+        alpha = (1 - x) / (intercepts - 1.0)
         j_bias = 1 - alpha * intercepts
-        return alpha, j_bias
+        return np.float32(alpha), np.float32(j_bias)
 
     def update(self, J, dt):
         """Theano update rule that implementing LIF rate neuron type.
@@ -1,12 +1,21 @@
+import copy
+from multiprocessing.pool import ThreadPool
 import random
 from _collections import OrderedDict
 import quantities
 
 import theano
 from theano import tensor as TT
+import theano.sparse
+from theano.compile.sharedvalue import SharedVariable
+from theano.sandbox.rng_mrg import MRG_RandomStreams
 import numpy as np
+import scipy.sparse
 
+from . import cache
 from . import ensemble
+from . import ensemble_origin
+from . import lif
 from . import simplenode
 from . import probe
 from . import origin
@@ -15,7 +24,9 @@ from . import subnetwork
 from . import helpers
 
 class Network(object):
-    def __init__(self, name, seed=None, fixed_seed=None, dt=.001):
+    def __init__(self, name, seed=None, fixed_seed=None, dt=.001,
+                 tick_cache=False, pack_neurons=False, 
+                 defer_decoders=False):
         """Wraps an NEF network with a set of helper functions
         for simplifying the creation of NEF models.
 
@@ -26,6 +37,25 @@ class Network(object):
             This one seed is used only to start the
             random generation process, so each neural group
             created will be different.
+        :param bool tick_cache:
+            if True, the compiled theano_tick function is saved to disk,
+            and loaded instead of recompiled whenever a network with
+            the same structure (and the same parameters) is run again.
+        :param bool pack_neurons:
+            if True, the LIF neurons of all spiking ensembles with the
+            same tau_rc and tau_ref are simulated as one population, 
+            so each group is updated with one set of elementwise ops.
+            Note that while packed, the voltage and refractory_time of
+            the ensembles' neurons are only brought up to date when 
+            the theano_tick function is remade.
+        :param bool defer_decoders:
+            if True, making ensembles and origins only queues the work
+            of computing their decoders. When the simulation is first
+            run, the decoders of the origins it reads from (through 
+            connections or probes) are computed together, on a pool 
+            of threads, and the origins nothing reads from are left 
+            out of the simulation, without computing their decoders.
+            See :func:`build()`.
 
         """
         self.name = name
@@ -33,12 +63,21 @@ class Network(object):
         self.run_time = 0.0    
         self.seed = seed
         self.fixed_seed = fixed_seed
+        self.tick_cache = tick_cache
+        self.pack_neurons = pack_neurons
+        self.defer_decoders = defer_decoders
+        # the PackedLIFNeurons simulating the packed ensembles' neurons
+        self.packs = []
+        # the ProbeGroups recording the probes
+        self.probe_groups = []
         # all the nodes in the network, indexed by name
         self.nodes = {}
         # the function call to run the theano portions of the model
         self.theano_tick = None
         # the list of nodes that have non-theano code
         self.tick_nodes = [] 
+        # the number of time steps run, counted in the theano function
+        self.step = theano.shared(np.int64(0), name='network.step')
         self.random = random.Random()
         if seed is not None:
             self.random.seed(seed)
@@ -48,18 +87,95 @@ class Network(object):
 
         Used for inputs, SimpleNodes, and Probes. These nodes will be
         added to the Theano graph if the node has an "update()" function,
-        but will also be triggered explicitly at every tick
-        via the node's `theano_tick()` function.
+        and will also be triggered explicitly at every tick
+        if the node has a `theano_tick()` function, unless its
+        `needs_tick` is False.
+        Probes are recorded inside the Theano graph, see 
+        :func:`make_probe_groups()`.
         
         :param Node node: the node to add to this network
 
         """
         # remake theano_tick function, in case the node has Theano updates 
         self.theano_tick = None 
-        self.tick_nodes.append(node)
+        if hasattr(node, 'theano_tick') and getattr(node, 'needs_tick', True):
+            self.tick_nodes.append(node)
         self.nodes[node.name] = node
 
         
+    def build(self, origins=None, threads=None, updates=None):
+        """Compute the decoders of the origins that are waiting
+        for them, made while the network defers its decoders.
+
+        The activity matrices of the different origins are computed
+        and factored on a pool of threads; numpy's LAPACK calls 
+        release the GIL, so the ensembles are solved in parallel
+        (the activities of neuron models other than LIF are simulated
+        with theano, one origin at a time).
+        Called with the updates of the simulation when it's built,
+        so there's no need to call it unless the decoders are wanted 
+        before the network is run.
+
+        :param list origins: 
+            the origins to compute the decoders of,
+            defaults to all the ones waiting for them
+        :param int threads: 
+            the number of threads, defaults to the number of CPUs
+        :param OrderedDict updates:
+            if not None, the updates of the simulation; the origins 
+            are then the ones waiting for their decoders that the 
+            rest of the simulation reads (through connections or 
+            probes), and the updates of the others are left out
+        """
+        pending = self.pending_origins()
+        if updates is not None and len(pending) > 0:
+            outputs = set(o.decoded_output for o in pending)
+            read = set(theano.gof.graph.inputs([value 
+                for var, value in updates.items() if var not in outputs]))
+            origins = [o for o in pending if o.decoded_output in read]
+            for o in pending:
+                if o not in origins: 
+                    updates.pop(o.decoded_output, None)
+        if origins is None: 
+            origins = pending
+        if len(origins) == 0:
+            return
+
+        # the activity matrices these origins need, some of which
+        # are computed by other origins of the same ensemble
+        needed = set((o.ensemble, key) for o in origins for key in o.keys
+                     if key not in o.ensemble.decoder_data)
+        factored = [o for o in pending 
+                    if o in origins or any((o.ensemble, o.keys[index]) 
+                        in needed for index in o.missing)]
+
+        pool = ThreadPool(threads)
+        try:
+            pool.map(ensemble_origin.EnsembleOrigin.factor_activities, 
+                     factored)
+        finally:
+            pool.close()
+            pool.join()
+
+        # all the activity matrices are ready, 
+        # including the ones shared between origins
+        for o in origins:
+            o.solve_decoders()
+
+    def pending_origins(self):
+        """Find the origins waiting for their decoders.
+
+        :returns: a list of EnsembleOrigins
+        """
+        origins = []
+        for node in self.nodes.values():
+            if not isinstance(node, ensemble.Ensemble): continue
+            for o in node.origin.values():
+                # aliased nodes appear more than once
+                if getattr(o, 'pending', False) and o not in origins:
+                    origins.append(o)
+        return origins
+
     def connect(self, pre, post, transform=None, weight=1,
                 index_pre=None, index_post=None, pstc=0.01, 
                 func=None):
@@ -190,7 +306,7 @@ class Network(object):
                 decoded_input=decoded_output) 
    
     def connect_neurons(self, pre, post, weight_matrix, pstc=0.01,
-            func=None):
+            func=None, low_rank_tol=None):
         """ This function makes a connection to post-synaptic neurons
         directly either from a pre-synaptic vector or neuron space, 
         depending on the shape of the weight matrix.
@@ -199,13 +315,22 @@ class Network(object):
         synaptic decoders, but replacing the post-synaptic encoders.
         If weight_matrix is (post.neurons x pre.neurons) then it connects
         the neurons of the two populations directly together.
+        A scipy.sparse weight_matrix always connects the neurons directly,
+        and is kept sparse in the theano graph, so the cost of the 
+        connection scales with the number of nonzero weights.
+        A tuple of 2-D factors, (U, V) or (encoders, transform, decoders),
+        also connects the neurons directly, with the weight matrix
+        U . V (or encoders . transform . decoders) kept factored in the
+        theano graph, so the cost of the connection scales with the
+        number of neurons times the rank of the factors.
 
         :param pre: pre-synaptic signal source
         :type pre: Ensemble, Input, SimpleNode
             note if neuron - neuron connection must be type Ensemble
         :param Ensemble post: post-synaptic population of neurons
         :param weight_matrix: set of connection weight strengths
-        :type weight_matrix: numpy.array, list
+        :type weight_matrix: 
+            numpy.array, list, scipy.sparse matrix, tuple of factors
         :param function func:
             Not for use on neuron-neuron connections, only vector-neurons connections.
             Function of the decoded origin to be the presynaptic connection.
@@ -213,9 +338,29 @@ class Network(object):
             The function takes a single parameter ``x``, which is
             the current value of the *pre* ensemble, and must return
             either a float or an array of floats.
+        :param float low_rank_tol:
+            if not None, a dense neuron - neuron weight_matrix is 
+            replaced by its truncated singular value decomposition,
+            keeping the singular values larger than low_rank_tol times
+            the largest, when that makes the connection cheaper.
         """
+        # reset timer in case the model has been run,
+        # as adding a new termination requires rebuilding the theano function
+        self.theano_tick = None
+
         post = self.get_object(post)
 
+        if scipy.sparse.issparse(weight_matrix):
+            # can't specify a function in this case
+            assert func is None
+            self.connect_neurons_sparse(pre, post, weight_matrix, pstc)
+            return
+        if isinstance(weight_matrix, tuple):
+            # can't specify a function in this case
+            assert func is None
+            self.connect_neurons_factored(pre, post, weight_matrix, pstc)
+            return
+
         # get the origin from the pre Node
         pre_origin = self.get_origin(pre, func)
         # get pre Node object from node dictionary
@@ -259,13 +404,26 @@ class Network(object):
             # get spiking output from pre population
             pre_output = pre.neurons.output 
 
-            encoded_output = (weight_matrix * pre_output)
-            # sum the contribution from all pre neurons
-            # for each post neuron
-            encoded_output = np.sum(encoded_output, axis=3)
-            # sum the contribution from each of the
-            # pre arrays for each post neuron
-            encoded_output = np.sum(encoded_output, axis=2)
+            # sum the contribution from all pre neurons of all the 
+            # pre arrays for each post neuron, as a single 
+            # (post.array_size * post.neurons_num x 
+            #  pre.array_size * pre.neurons_num) matrix-vector product
+            weight_matrix = weight_matrix.reshape(
+                post.array_size * post.neurons_num, 
+                pre.array_size * pre.neurons_num).astype('float32')
+
+            if low_rank_tol is not None:
+                # keep the weight matrix factored if it's low rank
+                factors = helpers.low_rank_factors(weight_matrix, 
+                                                   low_rank_tol)
+                if factors is not None:
+                    self.connect_neurons_factored(pre_name, post, 
+                                                  factors, pstc)
+                    return
+
+            encoded_output = TT.dot(weight_matrix, TT.flatten(pre_output))
+            encoded_output = TT.reshape(encoded_output, 
+                (post.array_size, post.neurons_num))
 
             # pass in the pre population encoded output function
             # to the post population, connecting them for theano
@@ -282,17 +440,102 @@ class Network(object):
         assert weight_matrix.shape ==  \
                    (post.array_size, post.neurons_num, dim_pre)
         
-        encoded_output = TT.zeros((post.array_size, post.neurons_num),
-                                   dtype='float32')
-        for ii in xrange(post.neurons_num):
-            encoded_output = TT.set_subtensor(encoded_output[:, ii],
-                 TT.dot(weight_matrix[:, ii], pre_output))
+        # project the decoded output onto all the post neurons of all the
+        # post arrays at once, as a single (post.array_size * 
+        # post.neurons_num x pre.origin.dimensions) matrix-vector product
+        weight_matrix = weight_matrix.reshape(
+            post.array_size * post.neurons_num, dim_pre).astype('float32')
+        encoded_output = TT.dot(weight_matrix, pre_output)
+        encoded_output = TT.reshape(encoded_output, 
+            (post.array_size, post.neurons_num))
 
         # pass in the pre population encoded output function
         # to the post population, connecting them for theano
         post.add_termination(name=pre_name, pstc=pstc, 
             encoded_input=encoded_output)
  
+    def connect_neurons_sparse(self, pre, post, weight_matrix, pstc):
+        """Connect the neurons of two populations directly together
+        with a sparse weight matrix.
+
+        :param string pre: name of the pre-synaptic population
+        :param Ensemble post: post-synaptic population of neurons
+        :param weight_matrix: 
+            (post.array_size * post.neurons_num x 
+             pre.array_size * pre.neurons_num) connection weights, 
+            or (post.neurons_num x pre.array_size * pre.neurons_num)
+            weights, repeated for each post array
+        :type weight_matrix: scipy.sparse matrix
+        :param float pstc: post-synaptic time constant
+        """
+        pre_name = pre
+        pre = self.get_object(pre)
+
+        weight_matrix = scipy.sparse.csr_matrix(weight_matrix, 
+                                                dtype='float32')
+        if weight_matrix.shape[0] == post.neurons_num: 
+            # repeat array_size times
+            weight_matrix = scipy.sparse.vstack(
+                [weight_matrix] * post.array_size, format='csr')
+        assert weight_matrix.shape == \
+                (post.array_size * post.neurons_num, 
+                 pre.array_size * pre.neurons_num)
+
+        weight_matrix = theano.sparse.shared(weight_matrix, 
+            name='%s.weight_matrix' % pre_name)
+
+        # get spiking output from pre population, as a column vector
+        pre_output = TT.flatten(pre.neurons.output).dimshuffle(0, 'x')
+        # only the nonzero weights are multiplied
+        encoded_output = theano.sparse.structured_dot(
+            weight_matrix, pre_output)
+        encoded_output = TT.reshape(encoded_output, 
+            (post.array_size, post.neurons_num))
+
+        # pass in the pre population encoded output function
+        # to the post population, connecting them for theano
+        post.add_termination(name=pre_name, pstc=pstc, 
+            encoded_input=encoded_output)
+
+    def connect_neurons_factored(self, pre, post, factors, pstc):
+        """Connect the neurons of two populations directly together
+        with a weight matrix given as a product of factors.
+
+        :param string pre: name of the pre-synaptic population
+        :param Ensemble post: post-synaptic population of neurons
+        :param tuple factors:
+            2-D matrices whose product is the weight matrix, the first
+            with post.array_size * post.neurons_num rows (or 
+            post.neurons_num rows, repeated for each post array), the 
+            last with pre.array_size * pre.neurons_num columns
+        :param float pstc: post-synaptic time constant
+        """
+        pre_name = pre
+        pre = self.get_object(pre)
+
+        factors = [np.asarray(f, dtype='float32') for f in factors]
+        for f, g in zip(factors[:-1], factors[1:]):
+            assert f.shape[1] == g.shape[0]
+        if factors[0].shape[0] == post.neurons_num: 
+            # repeat array_size times
+            factors[0] = np.tile(factors[0], (post.array_size, 1))
+        assert factors[0].shape[0] == post.array_size * post.neurons_num
+        assert factors[-1].shape[1] == pre.array_size * pre.neurons_num
+
+        # get spiking output from pre population
+        encoded_output = TT.flatten(pre.neurons.output)
+        # multiply by the factors from right to left, 
+        # so the full weight matrix is never formed
+        for f in reversed(factors):
+            encoded_output = TT.dot(f, encoded_output)
+        encoded_output = TT.reshape(encoded_output, 
+            (post.array_size, post.neurons_num))
+
+        # pass in the pre population encoded output function
+        # to the post population, connecting them for theano
+        post.add_termination(name=pre_name, pstc=pstc, 
+            encoded_input=encoded_output)
+
     def get_object(self, name):
         """This is a method for parsing input to return the proper object.
 
@@ -400,6 +643,7 @@ class Network(object):
         self.theano_tick = None
 
         kwargs['dt'] = self.dt
+        kwargs.setdefault('defer_decoders', self.defer_decoders)
         e = ensemble.Ensemble(*args, **kwargs) 
 
         # store created ensemble in node dictionary
@@ -419,7 +663,13 @@ class Network(object):
             array_size=length, **kwargs)
     
     def make_input(self, *args, **kwargs): 
-        """Create an input and add it to the network."""
+        """Create an input and add it to the network.
+
+        Inputs that aren't functions, and functions evaluated ahead of
+        the run with vectorized=True, are looked up inside the theano
+        function from the network's time step counter.
+        """
+        kwargs.setdefault('step', self.step)
         i = input.Input(*args, **kwargs)
         self.add(i)
         return i
@@ -459,35 +709,153 @@ class Network(object):
             target = self.get_object(target)
             # check to make sure target is an ensemble
             assert isinstance(target, ensemble.Ensemble)
-            target = target.neurons.output
-            # set the filter to zero
-            kwargs['pstc'] = 0
+            # spikes aren't filtered
+            if kwargs.setdefault('pstc', 0) != 0:
+                raise Exception("%s records spikes, " % name + 
+                    "which aren't filtered, so pstc has to be 0")
+            if not target.neurons.spiking:
+                # neurons that output firing rates are recorded as floats
+                target = target.neurons.output
+            elif kwargs.get('stream_dir') is not None:
+                raise Exception("%s records spikes, " % name + 
+                    "which can't be streamed to disk")
+            else:
+                del kwargs['pstc']
+                p = probe.SpikeProbe(name=name, target=target.neurons.output,
+                    target_name=target_name, dt_sample=dt_sample, 
+                    step=self.step, **kwargs)
+                self.add(p)
+                return p
 
         p = probe.Probe(name=name, target=target, target_name=target_name, 
             dt_sample=dt_sample, **kwargs)
         self.add(p)
         return p
             
-    def make_theano_tick(self):
-        """Generate the theano function for running the network simulation.
-        
-        :returns: theano function
+    def make_updates(self):
+        """Collect the theano updates of all the nodes in the network.
+
+        :returns: 
+            an ordered dictionary of shared variables and the theano 
+            description of how to compute them every time step
         """
         # dictionary for all variables
         # and the theano description of how to compute them 
         updates = OrderedDict()
 
-        # for every node in the network
+        # bring the packed neurons up to date before packing them again
+        for pack in self.packs:
+            pack.unpack()
+        self.packs = []
+        packed = []
+        if self.pack_neurons:
+            packed = self.make_packs()
+
+        try:
+            # for every node in the network
+            for node in self.nodes.values():
+                # if there is some variable to update
+                if hasattr(node, 'update'):
+                    # add it to the list of variables to update every time step
+                    updates.update(node.update(self.dt))
+        finally:
+            # give the ensembles back their own neurons
+            for ens, neurons in packed:
+                ens.neurons = neurons
+
+        for pack in self.packs:
+            updates = pack.pack_updates(updates, self.dt)
+
+        for group in self.make_probe_groups():
+            updates.update(group.update(self.dt))
+        updates[self.step] = self.step + 1
+
+        return updates
+
+    def make_probe_groups(self):
+        """Group the probes by dt_sample, pstc, max_samples and the 
+        number of samples taken, so each group of probes is recorded 
+        with a single filter and a single write to a shared buffer.
+
+        The probes of the previous groups are brought up to date first.
+
+        :returns: the list of ProbeGroups
+        """
+        for group in self.probe_groups:
+            group.unpack()
+
+        groups = OrderedDict()
         for node in self.nodes.values():
-            # if there is some variable to update
-            if hasattr(node, 'update'):
-                # add it to the list of variables to update every time step
-                updates.update(node.update(self.dt))
+            if not isinstance(node, probe.Probe): continue
+            # spike probes record themselves
+            if isinstance(node, probe.SpikeProbe): continue
+            key = (node.dt_sample, node.pstc, node.max_samples, node.i)
+            group = groups.setdefault(key, [])
+            # aliased nodes appear more than once
+            if node not in group:
+                group.append(node)
+
+        self.probe_groups = [probe.ProbeGroup(probes, self.step) 
+                             for probes in groups.values()]
+        return self.probe_groups
+
+    def make_packs(self):
+        """Group the LIF neurons of the spiking ensembles by tau_rc and
+        tau_ref, and replace each group with a PackedLIFNeuron.
+
+        The ensembles' neurons are swapped for views collecting their
+        input current, and have to be put back once the updates are made.
+
+        :returns: a list of (ensemble, neurons) pairs of the swapped neurons
+        """
+        groups = OrderedDict()
+        for node in self.nodes.values():
+            if not isinstance(node, ensemble.Ensemble): continue
+            if node.mode != 'spiking': continue
+            # only plain LIF neurons can be packed
+            if type(node.neurons) is not lif.LIFNeuron: continue
+
+            key = (node.neurons.tau_rc, node.neurons.tau_ref)
+            group = groups.setdefault(key, [])
+            # aliased nodes appear more than once
+            if node not in group:
+                group.append(node)
+
+        packed = []
+        for group in groups.values():
+            # nothing to gain from packing a single ensemble
+            if len(group) < 2: continue
+
+            pack = lif.PackedLIFNeuron([ens.neurons for ens in group])
+            for ens, view in zip(group, pack.views):
+                packed.append((ens, ens.neurons))
+                ens.neurons = view
+            self.packs.append(pack)
+
+        return packed
+
+    def make_theano_tick(self):
+        """Generate the theano function for running the network simulation.
+        
+        :returns: theano function
+        """
+        updates = self.make_updates()
+        # compute the decoders the simulation reads
+        self.build(updates=updates)
+
+        if self.tick_cache:
+            # look for a compiled function for a network of this structure
+            key = cache.generate_graph_key(updates)
+            theano_tick = cache.get_theano_tick(key, updates)
+            if theano_tick is None:
+                theano_tick = theano.function([], [], updates=updates.items())
+                cache.set_theano_tick(key, theano_tick)
+            return theano_tick
 
         # create graph and return optimized update function
         return theano.function([], [], updates=updates.items())#, mode='ProfileMode')
 
-    def run(self, time):
+    def run(self, time, multistep=False):
         """Run the simulation.
 
         If called twice, the simulation will continue for *time*
@@ -495,12 +863,54 @@ class Network(object):
         dt timestep specified when they are created.
         
         :param float time: the amount of time (in seconds) to run
-        :param float dt: the timestep of the update
+        :param bool multistep:
+            if True, run all the time steps between two ticks of the
+            non-theano nodes with a single call to the compiled theano
+            function, rather than calling it once per time step.
+            Every node in tick_nodes must then provide a
+            `tick_steps()` method, see :func:`run_multistep()`
         """         
         # if theano graph hasn't been calculated yet, retrieve it
         if self.theano_tick is None:
             self.theano_tick = self.make_theano_tick() 
-        for i in range(int(time / self.dt)):
+
+        # let the nodes allocate their storage for the whole run
+        for node in self.nodes.values():
+            if hasattr(node, 'reserve'):
+                node.reserve(self.run_time + time)
+
+        steps = int(time / self.dt)
+
+        # run in blocks short enough for the streaming probes
+        # to be flushed before they run out of room
+        streams = [node for node in self.nodes.values() 
+                   if isinstance(node, probe.Probe) and 
+                   node.stream is not None]
+        block = steps
+        for node in streams:
+            block = min(block, max(
+                int(node.chunk_size * node.dt_sample / self.dt), 1))
+
+        for start in range(0, steps, max(block, 1)):
+            if multistep:
+                self.run_multistep(min(block, steps - start), start)
+            else:
+                self.run_steps(min(block, steps - start), start)
+            for node in streams:
+                node.flush()
+
+        # update run_time variable
+        self.run_time += time
+
+    def run_steps(self, steps, start=0):
+        """Run the simulation for the given number of time steps,
+        calling the theano function once per time step.
+
+        :param int steps: the number of time steps to run
+        :param int start: 
+            the number of time steps already run since run_time
+        """
+        for i in range(start, start + steps):
             # get current time step
             t = self.run_time + i * self.dt
 
@@ -513,8 +923,214 @@ class Network(object):
             self.theano_tick()    
             if i % 1000 == 0: print 'time: ', t, 's'
 
-        # update run_time variable
-        self.run_time += time
+    def run_multistep(self, steps, start=0):
+        """Run the simulation for the given number of time steps,
+        calling the theano function once for each stretch of
+        time steps during which none of the non-theano nodes
+        has anything to do.
+
+        Each node in tick_nodes is asked, through its `tick_steps()`
+        method, at which of the upcoming time steps its `theano_tick()`
+        has to be called. Nodes without this method have to be ticked
+        every time step, and can't be run this way.
+
+        :param int steps: the number of time steps to run
+        :param int start: 
+            the number of time steps already run since run_time
+        """
+        # the times of all of the upcoming time steps
+        t = self.run_time + np.arange(start, start + steps) * self.dt
+
+        # find the time steps at which the non-theano nodes need to run
+        tick_steps = set()
+        for node in self.tick_nodes:
+            if not hasattr(node, 'tick_steps'):
+                raise Exception("%s has to run every time step, " % 
+                    node.name + "can't run the simulation multistep")
+            tick_steps.update(node.tick_steps(t))
+
+        i = 0 # the next time step to run
+        for step in sorted(tick_steps):
+            # run the theano nodes up to this time step
+            if step > i:
+                self.theano_tick.fn(n_calls=step - i)
+                i = step
+
+            # run the non-theano nodes
+            for node in self.tick_nodes:
+                node.t = t[step]
+                node.theano_tick()
+
+        # run the theano nodes for the rest of the time steps
+        if steps > i:
+            self.theano_tick.fn(n_calls=steps - i)
+
+    def run_batch(self, time, batch_size, seeds=None, inputs=None):
+        """Run batch_size independent trials of the simulation 
+        with one compiled function.
+
+        Every state variable of the network (neuron voltages, filters,
+        learned weights, noise streams) is stored with a leading batch
+        axis, and one call to the compiled function advances all the 
+        trials by a time step. Inside that call the trials are still 
+        simulated one after another, by a theano scan over the batch 
+        axis: no op sees the batch axis, so the trials don't share 
+        BLAS calls, and a batch is no faster per time step than 
+        running the trials one at a time with multistep=True. What's 
+        saved is building and compiling the network once for all the 
+        trials, and collecting their data in one place.
+        Trials differ in the seeds of their noise streams, and in the
+        values of the constant inputs given in *inputs*.
+
+        The trials start from the current state of the network, 
+        which is left as it is.
+
+        Only Inputs can be in tick_nodes, and Inputs with a function 
+        or a schedule give the same input to every trial.
+        Only the value of an Input that never changes can be set
+        for each trial. Probes streaming to disk can't be run in 
+        a batch.
+
+        :param float time: the amount of time (in seconds) to run
+        :param int batch_size: the number of trials to run
+        :param list seeds: 
+            the seed of the noise streams for each trial,
+            defaults to range(batch_size)
+        :param dict inputs:
+            the value of a constant Input for each trial,
+            as {input name: (batch_size x dimensions) array}
+        :returns: 
+            a dictionary of the data recorded by each probe, as 
+            {probe name: (batch_size x samples x shape) array}
+        """
+        if seeds is None: seeds = range(batch_size)
+        assert len(seeds) == batch_size
+        if inputs is None: inputs = {}
+
+        for node in self.tick_nodes:
+            if not isinstance(node, input.Input):
+                raise Exception("%s can't be run in a batch" % node.name)
+        for node in self.nodes.values():
+            # the ring buffers of the trials would wrap without 
+            # being flushed, losing samples
+            if isinstance(node, probe.Probe) and node.stream is not None:
+                raise Exception("%s streams to disk, " % node.name + 
+                    "it can't be run in a batch")
+
+        updates = self.make_updates()
+        self.build(updates=updates)
+        # the packs and probe groups made for the batch 
+        # replace the ones in theano_tick
+        self.theano_tick = None
+
+        for name in inputs:
+            node = self.get_object(name)
+            # the value set for each trial would be overwritten
+            if node.origin['X'].decoded_output in updates or \
+                    node in self.tick_nodes:
+                raise Exception("%s changes during the run, " % name + 
+                    "its value can't be set for each trial")
+
+        # the noise streams are updated through their default_update
+        for var in theano.gof.graph.inputs(updates.values()):
+            if isinstance(var, SharedVariable) and \
+                    getattr(var, 'default_update', None) is not None and \
+                    var not in updates:
+                updates[var] = var.default_update
+                
+        # let the nodes allocate their storage for the whole run,
+        # before it's copied for each trial
+        for node in self.nodes.values():
+            if hasattr(node, 'reserve'):
+                node.reserve(self.run_time + time)
+        spike_probes = [node for node in self.nodes.values() 
+                        if isinstance(node, probe.SpikeProbe)]
+
+        # make a batched copy of every state variable
+        batched = OrderedDict()
+        for var in updates.keys():
+            value = var.get_value()
+            if getattr(var, 'default_update', None) is not None:
+                # give each trial its own noise stream
+                value = np.array([
+                    MRG_RandomStreams(seed).get_substream_rstates(
+                        len(value), 'float32') for seed in seeds])
+            else:
+                value = np.tile(value, (batch_size,) + (1,) * value.ndim)
+            batched[var] = theano.shared(value, name='batch.%s' % var.name)
+
+        # and of the inputs with a different value for each trial
+        for name, value in inputs.items():
+            var = self.get_object(name).origin['X'].decoded_output
+            value = np.asarray(value, dtype=var.dtype)
+            batched[var] = theano.shared(
+                value.reshape((batch_size,) + var.get_value().shape),
+                name='batch.%s' % var.name)
+
+        def step(*trial):
+            # the updates of a single trial
+            return theano.clone([updates[var] for var in updates.keys()],
+                                replace=zip(batched.keys(), trial))
+        new_batched, _ = theano.scan(step, sequences=batched.values())
+        if not isinstance(new_batched, list): new_batched = [new_batched]
+        batch_tick = theano.function([], [], 
+            updates=zip(batched.values()[:len(updates)], new_batched))
+
+        # tick copies of the inputs, so the network's inputs are untouched
+        inputs_values = [(node.origin['X'].decoded_output, 
+                          node.origin['X'].decoded_output.get_value()) 
+                         for node in self.tick_nodes]
+        tick_nodes = [copy.copy(node) for node in self.tick_nodes]
+
+        # the times of all of the upcoming time steps
+        steps = int(time / self.dt)
+        t = self.run_time + np.arange(steps) * self.dt
+
+        # find the time steps at which the inputs need to run
+        tick_steps = set()
+        for node in tick_nodes:
+            tick_steps.update(node.tick_steps(t))
+
+        i = 0 # the next time step to run
+        for step in sorted(tick_steps):
+            # run the trials up to this time step
+            if step > i:
+                batch_tick.fn(n_calls=step - i)
+                i = step
+
+            for node in tick_nodes:
+                node.t = t[step]
+                node.theano_tick()
+
+        # run the trials for the rest of the time steps
+        if steps > i:
+            batch_tick.fn(n_calls=steps - i)
+
+        for var, value in inputs_values:
+            var.set_value(value)
+
+        # the samples each probe recorded in each trial during this run
+        data = {}
+        for group in self.probe_groups:
+            buffers = batched[group.buffer].get_value(borrow=True)
+            lasts = batched[group.last].get_value()
+            for node in group.probes:
+                trials = []
+                for buffer, last in zip(buffers, lasts):
+                    trial = node.get_data(
+                        group.probe_data(node, buffer), last)
+                    trials.append(
+                        trial[max(len(trial) - (last - group.i), 0):])
+                data[node.name] = np.array(trials)
+        for node in spike_probes:
+            buffers = batched[node.buffer].get_value(borrow=True)
+            lasts = batched[node.last].get_value()
+            trials = []
+            for buffer, last in zip(buffers, lasts):
+                trial = node.get_data(buffer, last)
+                trials.append(trial[max(len(trial) - (last - node.i), 0):])
+            data[node.name] = np.array(trials)
+        return data
 
     def write_data_to_hdf5(self, filename='data'):
         """This is a function to call after simulation that writes the 
@@ -549,8 +1165,10 @@ class Network(object):
         #TODO: pair any analog signals and spike trains from the same
         #      population together into a RecordingChannel
         for probe in probe_list:
-            # decoded signals become AnalogSignals
-            if probe.target_name.endswith('decoded'):
+            # decoded signals, and the firing rates of rate neurons, 
+            # become AnalogSignals
+            if probe.target_name.endswith('decoded') or \
+                    not hasattr(probe, 'get_spike_times'):
                 segment.analogsignals.append(
                     neo.AnalogSignal(
                         probe.get_data() * quantities.dimensionless, 
@@ -558,16 +1176,13 @@ class Network(object):
                         target_name=probe.target_name) )
             # spikes become spike trains
             elif probe.target_name.endswith('spikes'):
-                # have to change spike train of 0s and 1s to list of times
-                for neuron in probe.get_data().T:
+                # the end of the recording
+                t_stop = (probe.i + 1) * probe.dt_sample * quantities.s
+                for times in probe.get_spike_times():
                     segment.spiketrains.append(
                         neo.SpikeTrain(
-                            [
-                                t * probe.dt_sample 
-                                for t, val in enumerate(neuron[0]) 
-                                if val > 0
-                            ] * quantities.s,
-                            t_stop=len(probe.data),
+                            times * quantities.s,
+                            t_stop=t_stop,
                             target_name=probe.target_name) )
             else: 
                 print 'Do not know how to write %s to NeoHDF5 file'%probe.target_name
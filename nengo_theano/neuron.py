@@ -60,6 +60,8 @@ class Neuron(object):
     and should most likely define a more complicated reset function.
 
     """
+    # whether the output is spikes, rather than firing rates
+    spiking = False
 
     def __init__(self, size):
         """Constructor for neuron model superclass.
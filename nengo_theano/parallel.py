@@ -0,0 +1,91 @@
+"""Run many trials of a model across a pool of processes.
+
+Each worker builds its own Network with a user supplied function, runs
+it, and sends back the data recorded by its probes as numpy arrays.
+The decoder cache (and, for networks made with tick_cache=True, the
+compiled theano_tick functions) is shared by all the workers through
+the files in :mod:`cache`, which are written atomically. The network
+of the first trial is made before the workers start, so the decoders
+it has in common with the other trials are computed once and loaded
+from the cache by the workers; decoders only other trials need can
+still be computed by several workers at the same time.
+
+"""
+
+import multiprocessing
+import random
+
+import numpy as np
+
+from . import probe
+
+def get_probe_data(net):
+    """Collect the data recorded by all the probes in a network.
+
+    :param Network net: the network to collect from
+    :returns: a dictionary of {probe name: data array}
+    """
+    return dict([(node.name, node.get_data())
+                 for node in net.nodes.values()
+                 if isinstance(node, probe.Probe)])
+
+def run_trial(make_net, args, time, run_kwargs):
+    """Build and run one trial, in a worker process.
+
+    :param function make_net: builds the Network for a trial
+    :param tuple args: the arguments to make_net
+    :param float time: the amount of time (in seconds) to run
+    :param dict run_kwargs: extra keyword arguments to Network.run
+    :returns: a dictionary of {probe name: data array}
+    """
+    net = make_net(*args)
+    net.run(time, **run_kwargs)
+    return get_probe_data(net)
+
+def run_trial_job(job):
+    """Unpack a job for :func:`run_trial()`, for Pool.map."""
+    return run_trial(*job)
+
+def reseed():
+    """Give each worker its own random state,
+    rather than the copy it was forked with."""
+    np.random.seed()
+    random.seed()
+
+def run_trials(make_net, args_list, time, processes=None, **run_kwargs):
+    """Build and run a trial for each set of arguments,
+    spread over a pool of processes.
+
+    make_net has to be picklable, i.e. defined at the top level of a
+    module, and should seed numpy's random number generator itself for
+    the trials to be reproducible.
+
+    :param function make_net:
+        builds the Network for a trial from the trial's arguments
+    :param list args_list:
+        the arguments to make_net for each trial, either as tuples
+        or as single values
+    :param float time: the amount of time (in seconds) to run each trial
+    :param int processes:
+        the number of worker processes, defaults to the number of cores
+    :param run_kwargs: extra keyword arguments to Network.run
+    :returns:
+        a list of dictionaries of {probe name: data array},
+        in the order of args_list
+    """
+    jobs = []
+    for args in args_list:
+        if not isinstance(args, tuple): args = (args,)
+        jobs.append((make_net, args, time, run_kwargs))
+    if len(jobs) == 0:
+        return []
+
+    # fill the decoder cache before the workers look in it
+    make_net(*jobs[0][1]).build()
+
+    pool = multiprocessing.Pool(processes, initializer=reseed)
+    try:
+        return pool.map(run_trial_job, jobs)
+    finally:
+        pool.close()
+        pool.join()
@@ -1,66 +1,402 @@
 import collections
 
-import numpy as np
-import theano
-import collections
-
 import numpy as np
 import theano
 import theano.tensor as TT
 
 from .filter import Filter
+from .stream import ProbeStream
 
 class Probe(object):
     """A class to record from things (i.e., origins).
 
-    """
-    buffer_size = 1000
+    The samples are recorded inside the theano function by the ProbeGroup
+    the probe is part of, and only copied to the host when asked for.
 
-    def __init__(self, name, target, target_name, dt_sample, pstc=0.03):
+    """
+    def __init__(self, name, target, target_name, dt_sample, pstc=0.03,
+                 max_samples=None, stream_dir=None, chunk_size=10000):
         """
         :param string name:
         :param target:
-        :type target: 
+        :type target:
         :param string target_name:
         :param float dt_sample:
         :param float pstc:
+        :param int max_samples:
+            if not None, only the last max_samples samples are kept,
+            in a ring buffer, so the probe can record endless runs
+        :param string stream_dir:
+            if not None, the samples are written to this directory in
+            chunks of chunk_size samples while the simulation runs,
+            see :class:`stream.ProbeStream`, and only the samples not
+            written yet are kept in memory
+        :param int chunk_size: the number of samples in each chunk
         """
         self.name = name
         self.target = target
         self.target_name = target_name
         self.dt_sample = dt_sample
+        self.pstc = pstc
+        self.stream = None
+        if stream_dir is not None:
+            self.stream = ProbeStream(stream_dir)
+            self.chunk_size = chunk_size
+            # index of the last sample written to the stream
+            self.flushed = -1
+            # room for the samples of the chunk being written, and of 
+            # the time step that passes the end of the chunk
+            max_samples = 2 * chunk_size
+        self.max_samples = max_samples
+        self.shape = target.get_value().shape
+        # the ProbeGroup recording this probe, set by the network
+        self.group = None
+
+        # the state of the probe while it's not part of a group:
+        # the samples taken, the index of the last sample taken,
+        # and the filtered value
+        if max_samples is None:
+            self.saved_data = np.zeros((0,) + self.shape, dtype='float32')
+        else:
+            self.saved_data = np.zeros((max_samples,) + self.shape,
+                                       dtype='float32')
+        self.saved_i = -1
+        self.saved_value = np.float32(target.get_value())
+
+    @property
+    def data(self):
+        if self.group is not None:
+            return self.group.probe_data(self)
+        return self.saved_data
+
+    @property
+    def i(self):
+        if self.group is not None:
+            return self.group.i
+        return self.saved_i
+
+    def reserve(self, t):
+        """Allocate the storage for all the samples up to time t,
+        called by the network before a run.
+
+        :param float t: the time at which the run ends
+        """
+        if self.group is not None:
+            self.group.reserve(t)
+
+    def flush(self):
+        """Write the samples taken since the last flush to the stream,
+        called by the network at least every chunk_size samples.
+        """
+        i = self.i
+        if i <= self.flushed:
+            return
+        assert i - self.flushed <= self.max_samples, \
+            "%s wasn't flushed in time, samples were lost" % self.name
+        index = np.arange(self.flushed+1, i+1) % self.max_samples
+        self.stream.write(self.data[index])
+        self.flushed = i
+
+    def get_data(self, data=None, i=None):
+        """
+        :param array data:
+            the samples to read from instead of the probe's own,
+            as returned by :func:`ProbeGroup.probe_data()`
+        :param int i: the index of the last sample in *data*
+        """
+        if data is None and self.stream is not None:
+            # the samples written to the stream, and the ones not yet
+            index = np.arange(self.flushed+1, self.i+1) % self.max_samples
+            return np.concatenate(
+                self.stream.read() + [self.data[index]])
+        if data is None:
+            data, i = self.data, self.i
+        if self.max_samples is not None:
+            # the samples still in the ring buffer, oldest first
+            index = np.arange(max(i+1 - self.max_samples, 0), i+1)
+            return data[index % self.max_samples]
+        return np.array(data[:i+1])
 
-        # create array to store the data over many time steps
-        self.data = np.zeros((self.buffer_size,) + target.get_value().shape)
-        self.i = -1 # index of the last sample taken
 
-        # create a filter to filter the data
-        self.filter = Filter(name=name, pstc=pstc, source=target)
+class ProbeGroup(object):
+    def __init__(self, probes, step):
+        """A set of Probes with the same dt_sample, pstc and max_samples,
+        that have taken the same number of samples, filtered and recorded
+        together inside the theano function, with one filter, one shared
+        buffer and one sample counter for the whole group.
+
+        :param list probes: the Probes to record
+        :param step: the network's time step counter
+        :type step: theano shared variable
+
+        """
+        self.probes = probes
+        self.step = step
+        self.dt_sample = probes[0].dt_sample
+        self.pstc = probes[0].pstc
+        self.max_samples = probes[0].max_samples
+
+        # where each probe is in the flattened values of the group
+        self.sizes = [int(np.prod(p.shape)) for p in probes]
+        self.offsets = np.cumsum([0] + self.sizes)
+
+        # filter the targets of all the probes at once
+        source = TT.concatenate([TT.flatten(p.target) for p in probes])
+        self.filter = Filter(name='probe_group', pstc=self.pstc,
+            source=source, shape=(self.offsets[-1],))
+        self.filter.value.set_value(np.hstack(
+            [p.saved_value.flatten() for p in probes]))
+
+        # the samples of all the probes
+        rows = max(len(p.saved_data) for p in probes)
+        data = np.zeros((rows, self.offsets[-1]), dtype='float32')
+        for p, offset, size in zip(probes, self.offsets, self.sizes):
+            data[:len(p.saved_data), offset:offset + size] = \
+                p.saved_data.reshape(len(p.saved_data), size)
+        self.buffer = theano.shared(data, name='probe_group.buffer')
+        # index of the last sample taken
+        self.last = theano.shared(np.int64(probes[0].saved_i),
+                                  name='probe_group.last')
+
+        for p in probes:
+            p.group = self
+
+    @property
+    def i(self):
+        return int(self.last.get_value())
+
+    def probe_data(self, probe, data=None):
+        """The samples of one of the probes in the group.
+
+        :param Probe probe: the probe to get the samples of
+        :param array data:
+            a buffer of samples to read from instead of the group's own
+        """
+        if data is None:
+            data = self.buffer.get_value(borrow=True)
+        index = self.probes.index(probe)
+        offset, size = self.offsets[index], self.sizes[index]
+        return data[:, offset:offset + size].reshape(
+            (len(data),) + probe.shape)
+
+    def unpack(self):
+        """Copy the state of the group back into the probes."""
+        value = self.filter.value.get_value()
+        i = self.i
+        for p, offset, size in zip(self.probes, self.offsets, self.sizes):
+            p.saved_data = np.array(self.probe_data(p))
+            p.saved_i = i
+            p.saved_value = value[offset:offset + size].reshape(p.shape)
+            p.group = None
+
+    def reserve(self, t):
+        """Allocate the storage for all the samples up to time t.
+
+        The buffer at least doubles in size when it grows, so a run
+        extended many times only copies the data a few times.
+
+        :param float t: the time at which the run ends
+        """
+        if self.max_samples is not None:
+            return
+        samples = int(t / self.dt_sample) + 1
+        data = self.buffer.get_value(borrow=True)
+        if samples <= len(data):
+            return
+        new_data = np.zeros((max(samples, 2 * len(data)), data.shape[1]),
+                            dtype='float32')
+        new_data[:self.i+1] = data[:self.i+1]
+        self.buffer.set_value(new_data, borrow=True)
 
     def update(self, dt):
         """
         :param float dt: the timestep of the update
         """
-        return self.filter.update(dt)
+        updates = self.filter.update(dt)
+
+        # the sample point we're as close to as we're going to get
+        t = TT.cast(self.step, 'float64') * np.float64(dt)
+        i_samp = TT.cast(TT.floor(t / np.float64(self.dt_sample)), 'int64')
+
+        # record the filtered values from the last time step at every
+        # sample point passed since the last sample, none if no sample 
+        # point was passed, and all of them when dt_sample < dt
+        index = TT.arange(self.last + 1, TT.maximum(self.last, i_samp) + 1)
+        if self.max_samples is not None:
+            # wrapping around the buffer
+            index = index % self.max_samples
+        updates[self.buffer] = TT.set_subtensor(
+            self.buffer[index], 
+            TT.alloc(self.filter.value, index.shape[0], 
+                     self.filter.value.shape[0]))
+        updates[self.last] = TT.maximum(self.last, i_samp)
+        return updates
+
+
+class SpikeProbe(Probe):
+    """A probe recording the spikes of an ensemble's neurons.
+
+    The spikes are recorded inside the theano function as bit-packed 
+    rows, eight neurons to a byte, and every spike since the last sample 
+    point is kept in the next sample, so no spike is dropped when 
+    dt_sample is longer than the time step. 
+
+    """
+    def __init__(self, name, target, target_name, dt_sample, step,
+                 max_samples=None):
+        """
+        :param string name:
+        :param target: the output of the neurons
+        :type target: theano shared variable
+        :param string target_name:
+        :param float dt_sample:
+        :param step: the network's time step counter
+        :type step: theano shared variable
+        :param int max_samples:
+            if not None, only the last max_samples samples are kept,
+            in a ring buffer, so the probe can record endless runs
+        """
+        self.name = name
+        self.target = target
+        self.target_name = target_name
+        self.dt_sample = dt_sample
+        self.step = step
+        self.max_samples = max_samples
+        self.stream = None
+        self.shape = target.get_value().shape
+        self.neurons = int(np.prod(self.shape))
+        # the number of bytes to a row of packed spikes
+        self.nbytes = (self.neurons + 7) // 8
+
+        rows = 0 if max_samples is None else max_samples
+        self.buffer = theano.shared(
+            np.zeros((rows, self.nbytes), dtype='uint8'), 
+            name='spike_probe.buffer')
+        # the spikes since the last sample point
+        self.spiked = theano.shared(
+            np.zeros(self.nbytes, dtype='uint8'), name='spike_probe.spiked')
+        # index of the last sample taken
+        self.last = theano.shared(np.int64(-1), name='spike_probe.last')
+
+    @property
+    def data(self):
+        return self.buffer.get_value(borrow=True)
+
+    @property
+    def i(self):
+        return int(self.last.get_value())
+
+    def reserve(self, t):
+        """Allocate the storage for all the samples up to time t,
+        called by the network before a run.
+
+        :param float t: the time at which the run ends
+        """
+        if self.max_samples is not None:
+            return
+        samples = int(t / self.dt_sample) + 1
+        data = self.buffer.get_value(borrow=True)
+        if samples <= len(data):
+            return
+        new_data = np.zeros((max(samples, 2 * len(data)), self.nbytes),
+                            dtype='uint8')
+        new_data[:self.i+1] = data[:self.i+1]
+        self.buffer.set_value(new_data, borrow=True)
+
+    def get_packed(self, data=None, i=None):
+        """The packed rows of spikes, oldest first, 
+        as returned by np.packbits.
 
-    def theano_tick(self):
+        :param array data: 
+            the buffer to read from instead of the probe's own
+        :param int i: the index of the last sample in *data*
+        :returns: 
+            the index of the first sample, 
+            and a (samples x bytes) array of uint8
         """
+        if data is None:
+            data, i = self.data, self.i
+        if self.max_samples is not None:
+            # the samples still in the ring buffer, oldest first
+            first = max(i+1 - self.max_samples, 0)
+            return first, data[np.arange(first, i+1) % self.max_samples]
+        return 0, data[:i+1]
+
+    def get_data(self, data=None, i=None):
+        """The spikes as a dense array of 0s and 1s.
+
+        :param array data: 
+            the buffer to read from instead of the probe's own
+        :param int i: the index of the last sample in *data*
+        :returns: a (samples x array_size x neurons) array
         """
-        i_samp = int(self.t / self.dt_sample)
-        if i_samp > self.i:
-            # we're as close to a sample point as we're going to get,
-            # so take a sample
-            if i_samp >= len(self.data):
-                # increase the buffer
-                self.data = np.vstack(
-                    [self.data, np.zeros((self.buffer_size,)
-                                         + self.data.shape[1:])])
+        first, packed = self.get_packed(data, i)
+        bits = np.unpackbits(packed, axis=1)[:, :self.neurons]
+        return bits.reshape((len(packed),) + self.shape).astype('float32')
 
-            # record the filtered value
-            self.data[self.i+1:i_samp+1] = self.filter.value.get_value()
-            self.i = i_samp
+    def get_events(self, chunk_size=10000):
+        """The spikes as a list of events.
 
-    def get_data(self):
+        :param int chunk_size: 
+            the number of rows unpacked at a time, 
+            to bound the memory used
+        :returns: 
+            the sample indices and the flattened neuron indices 
+            of the spikes, ordered by sample
         """
+        first, packed = self.get_packed()
+        samples, neurons = [], []
+        for start in range(0, len(packed), chunk_size):
+            bits = np.unpackbits(
+                packed[start:start + chunk_size], axis=1)[:, :self.neurons]
+            s, n = np.nonzero(bits)
+            samples.append(s + first + start)
+            neurons.append(n)
+        if len(samples) == 0:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64')
+        return np.concatenate(samples), np.concatenate(neurons)
+
+    def get_spike_times(self):
+        """The spike times of each neuron.
+
+        :returns: 
+            a list of arrays of spike times in seconds, 
+            one for each (flattened) neuron
         """
-        return self.data[:self.i+1]
+        samples, neurons = self.get_events()
+        # sort the events by neuron, keeping them in time order
+        order = np.argsort(neurons, kind='mergesort')
+        times = samples[order] * self.dt_sample
+        return np.split(times, np.searchsorted(
+            neurons[order], np.arange(1, self.neurons)))
+
+    def update(self, dt):
+        """
+        :param float dt: the timestep of the update
+        """
+        # pack the spikes eight neurons to a byte, like np.packbits
+        bits = TT.cast(TT.neq(TT.flatten(self.target), 0), 'uint8')
+        pad = self.nbytes * 8 - self.neurons
+        if pad > 0:
+            bits = TT.concatenate([bits, TT.zeros((pad,), dtype='uint8')])
+        weights = np.asarray(2 ** np.arange(7, -1, -1), dtype='uint8')
+        packed = TT.sum(bits.reshape((self.nbytes, 8)) * weights, 
+                        axis=1, dtype='uint8')
+
+        # the sample point we're as close to as we're going to get
+        t = TT.cast(self.step, 'float64') * np.float64(dt)
+        i_samp = TT.cast(TT.floor(t / np.float64(self.dt_sample)), 'int64')
+
+        # start a new sample when a sample point is passed, 
+        # and otherwise add the spikes to the current one
+        spiked = TT.switch(TT.gt(i_samp, self.last), 
+                           packed, TT.or_(self.spiked, packed))
+        index = i_samp
+        if self.max_samples is not None:
+            # wrapping around the buffer
+            index = index % self.max_samples
+
+        return collections.OrderedDict([
+            (self.spiked, spiked),
+            (self.buffer, TT.set_subtensor(self.buffer[index], spiked)),
+            (self.last, TT.maximum(self.last, i_samp))])
@@ -0,0 +1,114 @@
+import numpy as np
+import scipy.linalg
+
+# types registry (plugin pattern)
+# The types registry maps strings like 'eigh' and 'cholesky'
+# to the Solvers used to compute the decoders of an EnsembleOrigin
+types = {}
+
+
+class Solver(object):
+    """Superclass for decoder solvers.
+
+    Solving for the decoders is split into factoring the activity
+    matrix, which only depends on the ensemble and so can be cached
+    and shared by all its origins, and solving for the decoders of
+    a particular function with that factorization.
+
+    """
+    def factor(self, A, decoder_noise):
+        """Factor the activity matrix.
+
+        :param array A:
+            the (neurons x samples) activity matrix, with noise added
+        :param float decoder_noise:
+            the amount of noise to assume, relative to the largest
+            singular value (or firing rate) of A
+        :returns: an array describing the factorization
+        """
+        raise NotImplementedError()
+
+    def solve(self, F, A, target_values):
+        """Solve for the decoders with a factorization of A.
+
+        :param array F: the factorization returned by factor()
+        :param array A: the (neurons x samples) activity matrix
+        :param array target_values:
+            the (func_size x samples) target values
+        :returns: the (neurons x func_size) decoders
+        """
+        raise NotImplementedError()
+
+
+class EighSolver(Solver):
+    """Pseudo-inverse of the correlation matrix G = AA', leaving out
+    the eigenvalues below decoder_noise**2 times the largest one.
+
+    F is the (neurons x neurons) pseudo-inverse of G.
+
+    """
+    def factor(self, A, decoder_noise):
+        # eigh for symmetric matrices, returns
+        # evalues w and normalized evectors v
+        w, v = np.linalg.eigh(np.dot(A, A.T))
+
+        # formerly 0.1 * 0.1 * max(w), set threshold
+        limit = decoder_noise * decoder_noise * max(w)
+        v_we_want = np.float32(v[:, w >= limit] / np.sqrt(w[w >= limit]))
+        return np.dot(v_we_want, v_we_want.T)
+
+    def solve(self, F, A, target_values):
+        U = np.dot(np.float32(A), np.float32(target_values.T))
+        return np.dot(np.float32(F), U)
+
+
+class LstsqSolver(Solver):
+    """Least-squares solution through the SVD of A, leaving out the
+    singular values below decoder_noise times the largest one.
+
+    This is the same solution as the eigh solver's, without forming
+    G, which squares the condition number.
+
+    F is the (neurons x samples) pseudo-inverse of A'.
+
+    """
+    def factor(self, A, decoder_noise):
+        return np.linalg.pinv(A.T, rcond=decoder_noise)
+
+    def solve(self, F, A, target_values):
+        return np.dot(F, target_values.T)
+
+
+class CholeskySolver(Solver):
+    """Regularized least-squares, adding samples * sigma**2 to the
+    diagonal of G = AA', with sigma = decoder_noise * max(A),
+    and solving with a Cholesky factorization.
+
+    When there are fewer samples than neurons, the (samples x samples)
+    system A'A is factored instead (the NxS method), since
+    A (A'A + lambda I)^-1 = (AA' + lambda I)^-1 A.
+
+    F is the lower triangular Cholesky factor of the smaller system.
+
+    """
+    def factor(self, A, decoder_noise):
+        neurons, samples = A.shape
+        sigma = decoder_noise * np.max(A)
+        if samples < neurons:
+            G = np.dot(A.T, A)
+        else:
+            G = np.dot(A, A.T)
+        G[np.diag_indices_from(G)] += samples * sigma * sigma
+        return scipy.linalg.cholesky(G, lower=True)
+
+    def solve(self, F, A, target_values):
+        neurons, samples = A.shape
+        if len(F) == samples and samples < neurons:
+            return np.dot(A, scipy.linalg.cho_solve(
+                (F, True), target_values.T))
+        return scipy.linalg.cho_solve((F, True), np.dot(A, target_values.T))
+
+
+types['eigh'] = EighSolver()
+types['lstsq'] = LstsqSolver()
+types['cholesky'] = CholeskySolver()
@@ -0,0 +1,53 @@
+"""Stream the samples of a probe to disk while the simulation runs.
+
+The samples are appended to a directory as numbered .npy chunks, each
+written atomically, so the memory used by a probe is bounded by its
+chunk size, and the chunks written survive a crash of the simulation.
+
+"""
+
+import glob
+import os
+
+import numpy as np
+
+from . import cache
+
+class ProbeStream(object):
+    def __init__(self, path):
+        """A directory of .npy chunks of samples.
+
+        Any chunks already in the directory are removed,
+        to start a new stream.
+
+        :param string path: the directory to write the chunks to
+        """
+        self.path = path
+        try:
+            os.makedirs(path)
+        except OSError:
+            # already exists
+            pass
+        for name in self.chunk_names():
+            os.remove(name)
+        self.chunks = 0
+
+    def chunk_names(self):
+        """The file names of the chunks written, in order."""
+        return sorted(glob.glob(os.path.join(self.path, 'chunk_*.npy')))
+
+    def write(self, samples):
+        """Append a chunk of samples to the stream.
+
+        :param array samples: the samples, oldest first
+        """
+        path = os.path.join(self.path, 'chunk_%08d.npy' % self.chunks)
+        cache.write_atomic(path, lambda f: np.save(f, samples))
+        self.chunks += 1
+
+    def read(self):
+        """Read all the chunks written, memory-mapped.
+
+        :returns: a list of arrays of samples
+        """
+        return [np.load(name, mmap_mode='r') for name in self.chunk_names()]
@@ -0,0 +1,16 @@
+"""Shared setup for the tests that compare networks made the same way."""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def make_network(name, seed, **kwargs):
+    """Make a Network, seeding numpy first, so that all the networks 
+    made with the same seed get the same neurons.
+
+    :param string name: the name of the network
+    :param int seed: the seed for numpy and the network
+    :param kwargs: extra keyword arguments to Network
+    """
+    np.random.seed(seed)
+    return nef.Network(name, seed=seed, **kwargs)
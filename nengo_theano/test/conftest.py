@@ -0,0 +1,13 @@
+import pytest
+
+from nengo_theano import cache
+
+@pytest.fixture(autouse=True)
+def temp_cache(tmpdir, monkeypatch):
+    """Give every test its own empty cache, so tests don't depend on 
+    the cache left by other tests or runs, and don't fill it up."""
+    monkeypatch.setattr(cache, 'cache_dir', str(tmpdir.mkdir('cache')))
+    monkeypatch.setattr(cache, 'tick_cache_dir', 
+                        str(tmpdir.join('tick_cache')))
+    monkeypatch.setattr(cache, 'cache_size', None)
+    monkeypatch.setattr(cache, 'tick_cache_size', None)
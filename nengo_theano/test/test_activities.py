@@ -0,0 +1,24 @@
+"""This is a test file to test computing the activity matrices of all
+the sub-populations of a network array at once, checking them against
+computing them one sub-population at a time.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_activities():
+    net = nef.Network('Activities Test')
+    A = net.make('A', neurons=40, dimensions=2, array_size=5)
+    origin = A.origin['X']
+
+    eval_points = origin.make_samples().astype('float32')
+    activities = origin.compute_activities(range(5), eval_points, net.dt)
+    assert activities.shape == (5, 40, origin.num_samples)
+    for index in range(5):
+        assert np.allclose(activities[index], origin.compute_activities(
+            [index], eval_points, net.dt)[0])
+
+    # every sub-population is solved with its own activity matrix
+    assert len(A.decoder_data) == 5
+    assert origin.decoders.get_value().shape == (5, 40, 2)
@@ -0,0 +1,59 @@
+"""This is a test file to test the updates of network arrays, checking
+that decoding and encoding all the sub-populations at once matches doing
+it for each sub-population on its own.
+"""
+
+import numpy as np
+import theano
+import theano.tensor as TT
+
+import nengo_theano as nef
+
+def test_batched_decode():
+    dt = .001
+    rng = np.random.RandomState(110)
+    for array_size in [1, 3]:
+        net = nef.Network('Batched Decode Test')
+        A = net.make('A', neurons=20, dimensions=2, array_size=array_size, 
+                     radius=2)
+        origin = A.origin['X']
+        spikes = rng.randint(2, size=(array_size, 20)).astype('float32')
+        A.neurons.output.set_value(spikes)
+
+        output = A.neurons.output
+        if array_size == 1:
+            # the neurons' new output is broadcastable along array_size
+            output = TT.addbroadcast(output, 0)
+        update = theano.function([], [], 
+                                 updates=origin.update(dt, output).items())
+        update()
+
+        decoders = origin.decoders.get_value()
+        decoded = np.hstack([np.dot(spikes[i], decoders[i]) 
+                             for i in range(array_size)]) * 2 / dt
+        assert np.allclose(origin.decoded_output.get_value(), decoded, 
+                           rtol=1e-4)
+
+def test_batched_encode():
+    dt = .001
+    rng = np.random.RandomState(111)
+    net = nef.Network('Batched Encode Test')
+    net.make_input('in', [.5, -.3, .2, .9, -.1, .4])
+    A = net.make('A', neurons=20, dimensions=2, array_size=3)
+    net.connect('in', 'A')
+    X = rng.uniform(-1, 1, size=(3, 2)).astype('float32')
+    A.decoded_input.values()[0].value.set_value(X)
+
+    # catch the input current the ensemble gives its neurons
+    currents = []
+    neurons_update = A.neurons.update
+    def update(J, dt):
+        currents.append(J)
+        return neurons_update(J, dt)
+    A.neurons.update = update
+    A.update(dt)
+    J = theano.function([], currents[0])()
+
+    for i in range(3):
+        assert np.allclose(J[i], A.bias[i] + 
+            np.dot(X[i], A.shared_encoders.get_value()[i].T), rtol=1e-4)
@@ -0,0 +1,119 @@
+"""This is a test file to test the on-disk cache of decoder data."""
+
+import cPickle
+import os
+
+import numpy as np
+
+import nengo_theano as nef
+from nengo_theano import cache
+
+def test_cache_key():
+    kwargs = dict(neurons=10, dimensions=2, tau_rc=.02, tau_ref=.002,
+        max_rate=(200, 300), intercept=(-1, 1), radius=1, encoders=None,
+        decoder_noise=.1, eval_points=None, noise=None, seed=1, dt=.001,
+        array_size=1)
+    key = cache.generate_ensemble_key(**kwargs)
+    assert key == cache.generate_ensemble_key(**kwargs)
+
+    # keys depend on the contents of arrays, not just their shape
+    kwargs['encoders'] = [[1, 0], [0, 1]]
+    key_enc = cache.generate_ensemble_key(**kwargs)
+    kwargs['encoders'] = [[1, 0], [0, -1]]
+    assert key_enc != cache.generate_ensemble_key(**kwargs)
+    assert key != key_enc
+
+def test_cache_arrays():
+    key = cache.generate_key('test_cache_arrays', np.random.rand(10))
+    assert cache.get_gamma_inv(key) is None
+
+    Ginv = np.random.rand(10, 10).astype('float32')
+    A = np.random.rand(10, 50)
+    cache.set_gamma_inv(key, (Ginv, A))
+
+    Ginv_cached, A_cached = cache.get_gamma_inv(key)
+    # arrays are memory-mapped from the cache file
+    assert isinstance(A_cached, np.memmap)
+    assert np.all(Ginv_cached == Ginv) and Ginv_cached.dtype == Ginv.dtype
+    assert np.all(A_cached == A)
+
+def test_cache_eviction():
+    max_cache_size = cache.max_cache_size
+    try:
+        value = np.zeros(1000)
+        keys = [cache.generate_key('test_cache_eviction', i, np.random.rand())
+                for i in range(3)]
+        paths = [os.path.join(cache.cache_dir, key + '.npy') for key in keys]
+
+        # leave room for two more arrays in the cache
+        cache.max_cache_size = 2 * value.nbytes + 500 + sum(
+            os.path.getsize(os.path.join(cache.cache_dir, name)) 
+            for name in os.listdir(cache.cache_dir))
+        cache.set_array(keys[0], value)
+        os.utime(paths[0], (1000, 1000))
+        cache.set_array(keys[1], value)
+        os.utime(paths[1], (2000, 2000))
+        # using the first array makes it the most recently used
+        cache.get_array(keys[0])
+        cache.set_array(keys[2], value)
+
+        # the least recently used array is the one evicted
+        assert cache.get_array(keys[0]) is not None
+        assert cache.get_array(keys[1]) is None
+        assert cache.get_array(keys[2]) is not None
+    finally:
+        cache.max_cache_size = max_cache_size
+
+def test_cache_size():
+    cache_stats = cache.cache_stats
+    listed = []
+    def counting_cache_stats(*args):
+        listed.append(True)
+        return cache_stats(*args)
+    value = np.zeros(1000)
+    keys = [cache.generate_key('test_cache_size', i, np.random.rand())
+            for i in range(2)]
+    cache.set_array(keys[0], value)
+    cache.cache_stats = counting_cache_stats
+    try:
+        # the cache isn't listed while it's known to fit
+        size = cache.cache_size
+        cache.set_array(keys[1], value)
+        assert listed == []
+        assert cache.cache_size == size + os.path.getsize(
+            os.path.join(cache.cache_dir, keys[1] + '.npy'))
+    finally:
+        cache.cache_stats = cache_stats
+
+def test_cache_write_error():
+    path = os.path.join(cache.cache_dir, 
+        cache.generate_key('test_cache_write_error') + '.pkl')
+    tmp_files = [name for name in os.listdir(cache.cache_dir)
+                 if name.endswith('.tmp')]
+
+    # a value that can't be pickled isn't cached, and leaves nothing behind
+    cache.write_atomic(path, lambda f: cPickle.dump(lambda: 0, f))
+    assert not os.path.exists(path)
+    assert tmp_files == [name for name in os.listdir(cache.cache_dir)
+                         if name.endswith('.tmp')]
+
+def test_shared_decoder_data():
+    get_gamma_inv = cache.get_gamma_inv
+    keys = []
+    def counting_get_gamma_inv(key):
+        keys.append(key)
+        return get_gamma_inv(key)
+    cache.get_gamma_inv = counting_get_gamma_inv
+    try:
+        net = nef.Network('Shared Decoder Data Test')
+        A = net.make('A', neurons=50, dimensions=1, array_size=2)
+        for power in range(2, 6):
+            A.add_origin('pow%d' % power, lambda x, p=power: x ** p, 
+                         dt=net.dt)
+    finally:
+        cache.get_gamma_inv = get_gamma_inv
+
+    # the cache is only looked at once for each sub-population,
+    # and all the origins are solved with the same activity matrix
+    assert len(keys) == 2
+    assert len(A.decoder_data) == 2
@@ -0,0 +1,28 @@
+"""This is a test file to test connecting a decoded output directly to
+post-synaptic neurons, checking the input current of the post neurons.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_decoded_neurons():
+    neurons = 20
+    array_size = 3
+
+    net = nef.Network('Decoded Neurons Test')
+    net.make_input('in', [.5, -.3])
+    net.make('A', neurons=1, dimensions=2, mode='direct')
+    net.make('B', neurons=neurons, dimensions=1, array_size=array_size)
+
+    weight_matrix = np.random.uniform(-1, 1, 
+        size=(array_size, neurons, 2))
+    # pstc < dt turns the filter off
+    net.connect('in', 'A', pstc=0)
+    net.connect_neurons('A', 'B', weight_matrix=weight_matrix, pstc=0)
+    net.run(.01)
+
+    B = net.get_object('B')
+    encoded_input = B.encoded_input[0].value.get_value()
+    assert np.allclose(encoded_input, 
+                       np.dot(weight_matrix, [.5, -.3]), atol=1e-5)
@@ -0,0 +1,82 @@
+"""This is a test file to test deferring the decoders of a network
+until it's built, checking that they come out the same as the decoders
+computed while the network is made.
+"""
+
+import os
+
+import numpy as np
+
+import nengo_theano as nef
+from nengo_theano import cache
+from nengo_theano.test.common import make_network
+
+def square(x):
+    return [x[0] * x[0]]
+
+def make_net(defer_decoders):
+    net = make_network('Deferred Decoders Test', seed=90, 
+                       defer_decoders=defer_decoders)
+    net.make('A', neurons=50, dimensions=1)
+    net.make('B', neurons=50, dimensions=2, array_size=3)
+    net.make('C', neurons=50, dimensions=1)
+    net.connect('A', 'C', func=square)
+    return net
+
+def test_deferred_decoders():
+    names = [('A', 'X'), ('A', 'square'), ('B', 'X'), ('C', 'X')]
+
+    net = make_net(defer_decoders=True)
+    origins = [net.get_object(name).origin[origin] 
+               for name, origin in names]
+    # nothing is computed yet
+    for o in origins:
+        assert o.pending
+        assert np.all(o.decoders.get_value() == 0)
+
+    net.build(threads=2)
+    for o in origins:
+        assert not o.pending
+        assert np.any(o.decoders.get_value() != 0)
+
+    # the same random numbers were used as when computing them right 
+    # away, in an empty cache, so the eager network draws its own noise
+    for name in os.listdir(cache.cache_dir):
+        os.remove(os.path.join(cache.cache_dir, name))
+    cache.cache_size = None
+    net_eager = make_net(defer_decoders=False)
+    # which it computed and cached again
+    assert len(os.listdir(cache.cache_dir)) > 0
+    for o, (name, origin) in zip(origins, names):
+        assert np.allclose(o.decoders.get_value(), 
+            net_eager.get_object(name).origin[origin].decoders.get_value())
+
+def test_lazy_decoders():
+    net = nef.Network('Lazy Decoders Test', defer_decoders=True)
+    net.make_input('in', [.5])
+    net.make('A', neurons=50, dimensions=1)
+    net.make('B', neurons=50, dimensions=1)
+    net.make('C', neurons=50, dimensions=1)
+    net.connect('in', 'A')
+    # A is only used through its neurons
+    net.connect_neurons('A', 'B', np.random.RandomState(91).normal(
+        scale=1e-3, size=(50, 50)))
+    net.make_probe('B', dt_sample=.01, pstc=.01)
+
+    net.run(.01)
+    # only the decoders the simulation reads from are computed
+    assert net.get_object('A').origin['X'].pending
+    assert not net.get_object('B').origin['X'].pending
+    assert net.get_object('C').origin['X'].pending
+    assert len(net.get_object('A').decoder_data) == 0
+
+    # connecting from C computes its decoders when the graph is remade
+    net.connect('C', 'B')
+    net.run(.01)
+    assert not net.get_object('C').origin['X'].pending
+
+    # and so does connecting from A's decoded output to C's neurons
+    net.connect_neurons('A', 'C', np.ones((1, 50, 1)))
+    net.run(.01)
+    assert not net.get_object('A').origin['X'].pending
+    assert np.any(net.get_object('A').origin['X'].decoders.get_value() != 0)
@@ -0,0 +1,60 @@
+"""This is a test file to test connecting neurons with a factored weight
+matrix, given as factors or found from a dense low rank weight matrix,
+checking that it runs the same as the dense weight matrix.
+"""
+
+import numpy as np
+
+from nengo_theano import helpers
+from nengo_theano.test.common import make_network
+
+neurons = 50
+dimensions = 2
+array_size = 2
+
+# a rank 2 weight matrix, encoders . transform . decoders
+rng = np.random.RandomState(50)
+encoders = rng.uniform(-1, 1, size=(neurons, dimensions))
+transform = np.array([[1, .5], [0, -1]])
+decoders = rng.uniform(-.001, .001, size=(dimensions, array_size * neurons))
+weight_matrix = np.dot(encoders, np.dot(transform, decoders))
+
+def make_net(mode):
+    net = make_network('Factored Weight Matrix Test', seed=51)
+    net.make_input('in', [.8, -.5])
+    net.make('A', neurons=neurons, dimensions=1, array_size=array_size)
+    net.make('B', neurons=neurons, dimensions=1, array_size=array_size)
+
+    net.connect('in', 'A')
+    if mode == 'dense':
+        net.connect_neurons('A', 'B', weight_matrix=weight_matrix)
+    elif mode == 'low_rank':
+        net.connect_neurons('A', 'B', weight_matrix=weight_matrix, 
+                            low_rank_tol=1e-5)
+    elif mode == 'factored':
+        net.connect_neurons('A', 'B', 
+                            weight_matrix=(encoders, transform, decoders))
+
+    Bp = net.make_probe('B', dt_sample=.01, pstc=.01)
+    return net, Bp
+
+def test_low_rank_factors():
+    U, V = helpers.low_rank_factors(weight_matrix, 1e-5)
+    assert U.shape == (neurons, 2) and V.shape == (2, array_size * neurons)
+    assert np.allclose(np.dot(U, V), weight_matrix, atol=1e-6)
+
+    # a full rank matrix isn't worth factoring
+    assert helpers.low_rank_factors(rng.uniform(size=(10, 10)), 1e-5) is None
+
+def test_factored_weight_matrix():
+    # computing decoders draws from numpy's random number generator, so 
+    # make sure they're cached before making the networks to compare
+    make_net('dense')
+
+    net, Bp = make_net('dense')
+    net.run(.1)
+
+    for mode in ['low_rank', 'factored']:
+        net_factored, Bp_factored = make_net(mode)
+        net_factored.run(.1)
+        assert np.allclose(Bp_factored.get_data(), Bp.get_data(), atol=1e-4)
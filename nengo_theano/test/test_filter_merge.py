@@ -0,0 +1,34 @@
+"""This is a test file to test that terminations with the same pstc share
+one filter, checking that it filters the sum of their inputs.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_filter_merge():
+    net = nef.Network('Filter Merge Test')
+    net.make_input('in1', [.5, -.3])
+    net.make_input('in2', [.2, .1])
+    net.make_input('in3', [.7, -.2])
+    net.make('A', neurons=1, dimensions=2, mode='direct')
+    net.make('B', neurons=1, dimensions=2, mode='direct')
+
+    net.connect('in1', 'A', pstc=.01)
+    net.connect('in2', 'A', pstc=.01)
+    net.connect('in2', 'A', pstc=.05)
+    net.connect('in3', 'B', pstc=.01)
+    net.connect('in2', 'B', pstc=.05)
+
+    A = net.get_object('A')
+    B = net.get_object('B')
+    # one filter for each pstc
+    assert sorted(A.decoded_input.keys()) == [.01, .05]
+
+    net.run(.1)
+
+    # in1 + in2 through one filter is the same as in3 through one filter
+    assert np.allclose(A.decoded_input[.01].value.get_value(), 
+                       B.decoded_input[.01].value.get_value())
+    assert np.allclose(A.decoded_input[.05].value.get_value(), 
+                       B.decoded_input[.05].value.get_value())
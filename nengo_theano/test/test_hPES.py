@@ -0,0 +1,108 @@
+"""This is a test file to test the hPES learning rule and the learned
+projection on network arrays, checking them against a direct computation
+for every pair of pre and post arrays.
+"""
+
+import numpy as np
+import theano
+
+import nengo_theano as nef
+
+def test_hPES():
+    pre_size, post_size = 2, 3
+    dt = .001
+
+    net = nef.Network('hPES Test', seed=60)
+    net.make('A', neurons=10, dimensions=1, array_size=pre_size)
+    net.make('B', neurons=15, dimensions=1, array_size=post_size)
+    net.make('error', neurons=1, dimensions=post_size, mode='direct')
+    learned_term = net.learn(pre='A', post='B', error='error')
+
+    A = net.get_object('A')
+    B = net.get_object('B')
+
+    # fill the state with random values
+    rng = np.random.RandomState(61)
+    for var in [A.neurons.output, B.neurons.output, learned_term.theta,
+                learned_term.pre_filtered, learned_term.post_filtered,
+                learned_term.error_value]:
+        var.set_value(rng.uniform(size=var.get_value().shape
+                                  ).astype('float32'))
+
+    new_wm = theano.function([], learned_term.learn())()
+    learn_output = theano.function([], B.encoded_input.values()[0].source)()
+
+    # the weight matrix index i = pre * post.array_size + post
+    wm = learned_term.weight_matrix.get_value()
+    error = learned_term.error_value.get_value().reshape(post_size, 1, 1)
+    encoded_error = np.sum(learned_term.encoders * error, axis=-1)
+    post = learned_term.post_filtered.get_value()
+    encoded_activity = (post * (post - learned_term.theta.get_value()) * 
+                        learned_term.gains)
+    pre = learned_term.pre_filtered.get_value()
+    rate = learned_term.learning_rate.eval()
+    ratio = learned_term.supervision_ratio
+
+    output = np.zeros((post_size, B.neurons_num))
+    for i in range(pre_size * post_size):
+        pre_i, post_i = i / post_size, i % post_size
+        delta = np.outer(
+            ratio * rate * encoded_error[post_i] + 
+            (1 - ratio) * rate * learned_term.scaling_factor * 
+            encoded_activity[post_i], pre[pre_i])
+        assert np.allclose(new_wm[i] - wm[i], delta, rtol=1e-2, atol=1e-10)
+
+        output[post_i] += np.dot(wm[i], A.neurons.output.get_value()[pre_i])
+    assert np.allclose(learn_output, output / dt, rtol=1e-4)
+
+def test_hPES_events():
+    net = nef.Network('hPES Events Test', seed=62)
+    net.make('A', neurons=10, dimensions=1, array_size=2)
+    net.make('B', neurons=15, dimensions=1, array_size=3)
+    net.make('error', neurons=1, dimensions=3, mode='direct')
+    dense_term = net.learn(pre='A', post='B', error='error')
+    event_term = net.learn(pre='A', post='B', error='error', 
+        learn_interval=4, activity_threshold=.5)
+    event_term.weight_matrix.set_value(dense_term.weight_matrix.get_value())
+    event_term.theta.set_value(dense_term.theta.get_value())
+
+    dense_term.error_value.set_value(
+        np.random.RandomState(63).uniform(size=3).astype('float32'))
+    wm = dense_term.weight_matrix.get_value()
+    dense_learn = theano.function([], dense_term.learn())
+    post_deltas, pre_traces = event_term.record_traces()
+    event_learn = theano.function([], event_term.learn(), updates=[
+        (event_term.post_deltas, post_deltas),
+        (event_term.pre_traces, pre_traces),
+        (event_term.step, (event_term.step + 1) % 4)])
+
+    # fill the state with random values, the same for both terminations,
+    # for each of the time steps of a learn_interval
+    rng = np.random.RandomState(64)
+    dense_delta = 0
+    active = False
+    for step in range(4):
+        for dense_var, event_var in [
+                (dense_term.pre_filtered, event_term.pre_filtered),
+                (dense_term.post_filtered, event_term.post_filtered)]:
+            value = rng.uniform(0, .6, size=dense_var.get_value().shape)
+            dense_var.set_value(value.astype('float32'))
+            event_var.set_value(value.astype('float32'))
+        dense_delta = dense_delta + dense_learn() - wm
+        active = active | (event_term.pre_filtered.get_value() > .5)
+
+        new_wm = event_learn()
+        # nothing is updated until the end of the learn_interval
+        if step < 3:
+            assert np.all(new_wm == wm)
+
+    # then the weights from pre neurons above the threshold at any time 
+    # step are updated by the sum of the updates of all the time steps
+    assert active.any() and not active.all()
+    active = np.tile(active[:, None, None, :], (1, 3, 1, 1)).reshape(6, 1, 10)
+    assert np.allclose(new_wm - wm, dense_delta * active, 
+                       rtol=1e-2, atol=1e-10)
+    assert event_term.step.get_value() == 0
+
+    # the event-driven update also runs as part of the network
+    net.run(.01)
@@ -0,0 +1,32 @@
+"""This is a test file to test the schedules of dict-valued inputs,
+checking that the values looked up inside the theano function match
+the ones set by ticking the input from python.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_input_schedule():
+    schedule = dict((t, np.sin(100 * t)) for t in np.arange(.0035, .2, .007))
+
+    net = nef.Network('Input Schedule Test')
+    net.make_input('sched', schedule)
+    net.make_input('zeroed', schedule, zero_after_time=.1005)
+    # without the network's step counter the input is ticked from python
+    net.add(nef.Input('sched_py', schedule))
+    net.add(nef.Input('zeroed_py', schedule, zero_after_time=.1005))
+
+    # only the python inputs need ticking
+    assert [node.name for node in net.tick_nodes] == ['sched_py', 'zeroed_py']
+
+    Sp = net.make_probe('sched', dt_sample=.001, pstc=0)
+    Zp = net.make_probe('zeroed', dt_sample=.001, pstc=0)
+    Sp_py = net.make_probe('sched_py', dt_sample=.001, pstc=0)
+    Zp_py = net.make_probe('zeroed_py', dt_sample=.001, pstc=0)
+
+    net.run(.1)
+    net.run(.1, multistep=True)
+    assert np.allclose(Sp.get_data(), Sp_py.get_data())
+    assert np.allclose(Zp.get_data(), Zp_py.get_data())
+    assert np.all(Zp.get_data()[-90:] == 0)
@@ -0,0 +1,81 @@
+"""This is a test file to test the LIF neurons, checking that the views
+of packed neurons stand in for the neurons they view, and that packed
+neurons are simulated the same as the neurons on their own.
+"""
+
+import collections
+
+import numpy as np
+import theano
+
+from nengo_theano import lif
+
+def test_lif_neuron_view():
+    neurons = lif.LIFNeuron(size=(2, 5), tau_rc=.03)
+    view = lif.LIFNeuronView(neurons)
+    # the view looks like the neurons, and outputs to the same place
+    assert view.spiking
+    assert view.output is neurons.output
+    assert (view.size, view.tau_rc, view.tau_ref) == ((2, 5), .03, .002)
+
+    J = theano.shared(np.ones((2, 5), dtype='float32'))
+    updates = view.update(J, .001)
+    # the input current is kept for the packed update, 
+    # and the new output is a placeholder of the same type
+    assert view.J is J
+    assert updates.keys() == [neurons.output]
+    assert updates[neurons.output] is view.spiked
+    assert view.spiked.type == neurons.output.type
+    # the state of the neurons is left to the packed update
+    assert neurons.voltage not in updates
+
+def test_packed_lif_neuron():
+    dt = .001
+    rng = np.random.RandomState(100)
+    sizes = [(2, 5), (3,)]
+    currents = [theano.shared(rng.uniform(0, 5, size=size).astype('float32'))
+                for size in sizes]
+    voltages = [rng.uniform(size=size).astype('float32') for size in sizes]
+
+    # the neurons on their own, and the same neurons packed together
+    neurons = [lif.LIFNeuron(size=size) for size in sizes]
+    neurons_packed = [lif.LIFNeuron(size=size) for size in sizes]
+    for n, n_packed, voltage in zip(neurons, neurons_packed, voltages):
+        n.voltage.set_value(voltage)
+        n_packed.voltage.set_value(voltage)
+    pack = lif.PackedLIFNeuron(neurons_packed)
+    assert pack.size == 13 and pack.sizes == [10, 3]
+    assert np.all(pack.voltage.get_value() == np.hstack(
+        [voltage.flatten() for voltage in voltages]))
+
+    updates = collections.OrderedDict()
+    for n, J in zip(neurons, currents):
+        updates.update(n.update(J, dt))
+    tick = theano.function([], [], updates=updates.items())
+
+    updates_packed = collections.OrderedDict()
+    for view, J in zip(pack.views, currents):
+        updates_packed.update(view.update(J, dt))
+    updates_packed = pack.pack_updates(updates_packed, dt)
+    # one update of the state of all the packed neurons
+    for n in neurons_packed:
+        assert n.voltage not in updates_packed
+    assert pack.voltage in updates_packed
+    tick_packed = theano.function([], [], updates=updates_packed.items())
+
+    spikes = 0
+    for i in range(50):
+        tick()
+        tick_packed()
+        for n, n_packed in zip(neurons, neurons_packed):
+            assert np.all(n_packed.output.get_value() == n.output.get_value())
+            spikes += n.output.get_value().sum()
+    assert spikes > 0
+
+    # unpacking gives the neurons their state back
+    pack.unpack()
+    for n, n_packed in zip(neurons, neurons_packed):
+        assert np.allclose(n_packed.voltage.get_value(), 
+                           n.voltage.get_value())
+        assert np.allclose(n_packed.refractory_time.get_value(), 
+                           n.refractory_time.get_value())
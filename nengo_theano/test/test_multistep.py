@@ -0,0 +1,51 @@
+"""This is a test file to test running the theano function for multiple
+time steps per call, checking that it records the same data as the
+standard one call per time step loop.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+from nengo_theano.test.common import make_network
+
+def make_net():
+    net = make_network('Multistep Test', seed=10)
+    net.make_input('in', [.5, -.3], zero_after_time=.15)
+    net.make_input('sched', {.05: .8, .12: -.4})
+    net.make('A', neurons=50, dimensions=2)
+
+    net.connect('in', 'A')
+    net.connect('sched', 'A')
+
+    Ip = net.make_probe('sched', dt_sample=.01, pstc=.01)
+    Ap = net.make_probe('A', dt_sample=.005, pstc=.01)
+    return net, Ip, Ap
+
+def test_multistep():
+    # computing decoders draws from numpy's random number generator, so 
+    # make sure they're cached before making the networks to compare
+    make_net()
+
+    net, Ip, Ap = make_net()
+    net.run(.1)
+    net.run(.1)
+
+    net_ms, Ip_ms, Ap_ms = make_net()
+    net_ms.run(.1, multistep=True)
+    net_ms.run(.1, multistep=True)
+
+    assert Ip_ms.get_data().shape == Ip.get_data().shape
+    assert Ap_ms.get_data().shape == Ap.get_data().shape
+    assert np.allclose(Ip_ms.get_data(), Ip.get_data())
+    assert np.allclose(Ap_ms.get_data(), Ap.get_data())
+
+def test_multistep_simplenode():
+    net = nef.Network('Multistep SimpleNode Test')
+    net.add(nef.SimpleNode('node'))
+
+    try:
+        net.run(.01, multistep=True)
+    except Exception as e:
+        assert 'multistep' in str(e)
+    else:
+        assert False, "SimpleNodes can't be run multistep"
@@ -0,0 +1,52 @@
+"""This is a test file to test packing the neurons of ensembles with the
+same neuron parameters into one population, checking that the packed
+network runs the same as the unpacked one.
+"""
+
+import numpy as np
+
+from nengo_theano.test.common import make_network
+
+def make_net(pack_neurons):
+    net = make_network('Pack Neurons Test', seed=30, 
+                       pack_neurons=pack_neurons)
+    net.make_input('in', [.5, -.3])
+    net.make('A', neurons=50, dimensions=2)
+    net.make('B', neurons=40, dimensions=1, array_size=2)
+    net.make('C', neurons=30, dimensions=2, tau_rc=.03)
+    net.make('D', neurons=30, dimensions=2)
+
+    net.connect('in', 'A')
+    net.connect('A', 'B')
+    net.connect('B', 'C')
+    net.connect('C', 'D')
+
+    probes = [net.make_probe(name, dt_sample=.01, pstc=.01) 
+              for name in ['A', 'B', 'C', 'D']]
+    return net, probes
+
+def test_pack_neurons():
+    # computing decoders draws from numpy's random number generator, so 
+    # make sure they're cached before making the networks to compare
+    make_net(False)
+
+    net, probes = make_net(False)
+    net.run(.1)
+
+    net_packed, probes_packed = make_net(True)
+    net_packed.run(.1)
+
+    # A, B and D have the same parameters, C is left on its own
+    assert len(net_packed.packs) == 1
+    assert len(net_packed.packs[0].neurons) == 3
+
+    for p, p_packed in zip(probes, probes_packed):
+        assert np.allclose(p_packed.get_data(), p.get_data())
+
+    # remaking the theano_tick function carries on from the packed state
+    net_packed.theano_tick = None
+    net.theano_tick = None
+    net.run(.1)
+    net_packed.run(.1)
+    for p, p_packed in zip(probes, probes_packed):
+        assert np.allclose(p_packed.get_data(), p.get_data())
@@ -0,0 +1,28 @@
+"""This is a test file to test running trials in a pool of processes,
+checking each trial against running the network in this process.
+"""
+
+import numpy as np
+
+from nengo_theano import parallel
+from nengo_theano.test.common import make_network
+
+def make_net(value):
+    net = make_network('Parallel Test', seed=80)
+    net.make_input('in', value)
+    net.make('A', neurons=50, dimensions=2)
+    net.connect('in', 'A')
+    net.make_probe('A', name='Ap', dt_sample=.01, pstc=.01)
+    return net
+
+def test_parallel():
+    values = [[.5, -.3], [-.2, .4], [0, .9]]
+    data = parallel.run_trials(make_net, values, .1, processes=2, 
+                               multistep=True)
+    assert len(data) == len(values)
+
+    for trial, value in enumerate(values):
+        net = make_net(value)
+        net.run(.1)
+        assert np.allclose(data[trial]['Ap'], 
+                           parallel.get_probe_data(net)['Ap'])
@@ -0,0 +1,68 @@
+"""This is a test file to test the storage of probe data, checking that
+it's allocated from the length of the run, and that the ring buffer keeps
+the most recent samples.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_probe_storage():
+    net = nef.Network('Probe Storage Test')
+    net.make_input('in', np.sin)
+    Ip = net.make_probe('in', dt_sample=.01, pstc=.01)
+    Ip_ring = net.make_probe('in', dt_sample=.01, pstc=.01, max_samples=7)
+
+    # exactly the samples needed for the run
+    net.run(.1)
+    assert len(Ip.data) == 11
+    assert len(Ip.get_data()) == 10
+
+    # growing at least doubles the storage
+    net.run(.05)
+    assert len(Ip.data) == 22
+    assert len(Ip.get_data()) == 15
+
+    assert len(Ip_ring.data) == 7
+    assert np.all(Ip_ring.get_data() == Ip.get_data()[-7:])
+
+def test_probe_groups():
+    net = nef.Network('Probe Groups Test')
+    net.make_input('in', [.5, -.3])
+    net.make_input('in2', np.sin)
+    Ip = net.make_probe('in', dt_sample=.01, pstc=0)
+    I2p = net.make_probe('in2', dt_sample=.01, pstc=0)
+    I2p_fine = net.make_probe('in2', dt_sample=.001, pstc=0)
+
+    net.run(.1)
+    # probes sampled the same way are recorded together
+    assert len(net.probe_groups) == 2
+    assert Ip.group is I2p.group
+
+    assert np.allclose(Ip.get_data(), [[.5, -.3]] * 10)
+    # each sample is the value from the time step before the sample point
+    assert np.allclose(I2p.get_data()[1:, 0], 
+                       np.sin(np.arange(1, 10) * .01 - .001), atol=1e-6)
+    assert np.allclose(I2p_fine.get_data()[1:, 0], 
+                       np.sin(np.arange(1, 100) * .001 - .001), atol=1e-6)
+
+    # adding a probe regroups the probes, keeping their data
+    data = I2p.get_data()
+    net.make_probe('in', dt_sample=.01, pstc=0)
+    net.run(.05)
+    assert len(I2p.get_data()) == 15
+    assert np.all(I2p.get_data()[:10] == data)
+
+def test_probe_fine_sampling():
+    net = nef.Network('Probe Fine Sampling Test')
+    net.make_input('in', lambda t: t + 1)
+    Ip = net.make_probe('in', dt_sample=.0005, pstc=0)
+    Ip_ring = net.make_probe('in', dt_sample=.0005, pstc=0, max_samples=7)
+
+    net.run(.01)
+    # every sample point passed in a time step gets that step's value
+    data = Ip.get_data()
+    assert len(data) == 19
+    assert np.all(data[1:] != 0)
+    assert np.all(data[1::2] == data[2::2])
+    assert np.all(Ip_ring.get_data() == data[-7:])
@@ -0,0 +1,35 @@
+"""This is a test file to test streaming the samples of a probe to disk,
+checking that the streamed data matches the data of a probe kept in
+memory, and that the chunks are on disk while the simulation runs.
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_probe_stream():
+    stream_dir = tempfile.mkdtemp()
+    try:
+        net = nef.Network('Probe Stream Test')
+        net.make_input('in', lambda t: [np.sin(10 * t), t])
+        Ip = net.make_probe('in', dt_sample=.002, pstc=.01)
+        Sp = net.make_probe('in', dt_sample=.002, pstc=.01,
+                            stream_dir=stream_dir, chunk_size=20)
+
+        net.run(.1)
+        # 51 samples, in chunks of at most 20
+        assert len(os.listdir(stream_dir)) == 3
+        # the ring buffer holds only two chunks' worth of samples
+        assert len(Sp.data) == 40
+        assert Sp.get_data().shape == Ip.get_data().shape
+        assert np.allclose(Sp.get_data(), Ip.get_data())
+
+        net.run(.05, multistep=True)
+        assert Sp.get_data().shape == Ip.get_data().shape
+        assert np.allclose(Sp.get_data(), Ip.get_data())
+    finally:
+        shutil.rmtree(stream_dir)
@@ -0,0 +1,79 @@
+"""This is a test file to test running many trials of a network at once,
+checking each trial against running the network on its own.
+"""
+
+import shutil
+import tempfile
+
+import numpy as np
+
+from nengo_theano.test.common import make_network
+
+def make_net(value=[.5, -.3], noise=None):
+    net = make_network('Run Batch Test', seed=70)
+    net.make_input('in', value)
+    net.make_input('sched', {.05: .8})
+    net.make('A', neurons=50, dimensions=2)
+    net.make('B', neurons=50, dimensions=2, noise=noise)
+
+    net.connect('in', 'A')
+    net.connect('sched', 'A')
+    net.connect('A', 'B')
+
+    net.make_probe('A', name='Ap', dt_sample=.01, pstc=.01)
+    Bp = net.make_probe('B', name='Bp', dt_sample=.005, pstc=.01)
+    return net, Bp
+
+def test_run_batch():
+    # computing decoders draws from numpy's random number generator, so 
+    # make sure they're cached before making the networks to compare
+    make_net()
+
+    values = [[.5, -.3], [-.2, .4], [0, .9]]
+    net, Bp = make_net()
+    data = net.run_batch(.1, 3, inputs={'in': values})
+    assert data['Ap'].shape == (3, 10, 2)
+    assert data['Bp'].shape == (3, 20, 2)
+
+    # the network itself hasn't moved
+    assert net.run_time == 0 and len(Bp.get_data()) == 0
+    assert np.allclose(
+        net.get_object('in').origin['X'].decoded_output.get_value(), 
+        values[0])
+
+    for trial, value in enumerate(values):
+        net, Bp = make_net(value=value)
+        net.run(.1)
+        assert np.allclose(data['Bp'][trial], Bp.get_data(), atol=1e-4)
+
+def test_run_batch_noise():
+    net, Bp = make_net(noise=1)
+    data = net.run_batch(.1, 3, seeds=[1, 2, 1])
+
+    # trials with the same seed are the same, and different otherwise
+    assert np.allclose(data['Bp'][0], data['Bp'][2])
+    assert not np.allclose(data['Bp'][0], data['Bp'][1])
+
+def test_run_batch_stream():
+    stream_dir = tempfile.mkdtemp()
+    try:
+        net, Bp = make_net()
+        net.make_probe('A', dt_sample=.01, stream_dir=stream_dir)
+        try:
+            net.run_batch(.1, 3)
+        except Exception as e:
+            assert 'batch' in str(e)
+        else:
+            assert False, "streaming probes can't be run in a batch"
+    finally:
+        shutil.rmtree(stream_dir)
+
+def test_run_batch_changing_inputs():
+    net, Bp = make_net()
+    # the schedule would overwrite the value of each trial
+    try:
+        net.run_batch(.1, 2, inputs={'sched': [[.1], [.2]]})
+    except Exception as e:
+        assert 'trial' in str(e)
+    else:
+        assert False, "scheduled inputs can't be set for each trial"
@@ -0,0 +1,58 @@
+"""This is a test file to test the decoder solvers, checking that they
+agree with each other, and that each origin can use its own solver.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+from nengo_theano import solvers
+
+def test_solvers():
+    # rates of rectified linear neurons
+    rng = np.random.RandomState(3)
+    x = np.linspace(-1, 1, 100)
+    gain = rng.uniform(50, 200, size=(80, 1))
+    bias = rng.uniform(-100, 100, size=(80, 1))
+    sign = np.sign(rng.uniform(-1, 1, size=(80, 1)))
+    A = np.maximum(gain * sign * x + bias, 0)
+    target_values = np.array([x, x ** 2])
+
+    decoders = {}
+    for name in ['eigh', 'lstsq', 'cholesky']:
+        solver = solvers.types[name]
+        F = solver.factor(A, .1)
+        decoders[name] = solver.solve(F, A, target_values)
+        assert decoders[name].shape == (80, 2)
+        error = np.dot(A.T, decoders[name]) - target_values.T
+        assert np.sqrt(np.mean(error ** 2)) < .05
+
+    # the same solution without forming G
+    assert np.allclose(np.dot(A.T, decoders['eigh']), 
+                       np.dot(A.T, decoders['lstsq']), atol=1e-3)
+
+    # fewer samples than neurons solves the smaller system
+    F = solvers.types['cholesky'].factor(A[:, ::4], .1)
+    assert F.shape == (25, 25)
+    D = solvers.types['cholesky'].solve(F, A[:, ::4], target_values[:, ::4])
+    assert D.shape == (80, 2)
+    error = np.dot(A.T, D) - target_values.T
+    assert np.sqrt(np.mean(error ** 2)) < .1
+
+def test_origin_solver():
+    net = nef.Network('Solver Test')
+    A = net.make('A', neurons=100, dimensions=1, decoder_solver='cholesky')
+    A.add_origin('square', lambda x: x * x, dt=net.dt, solver='lstsq')
+    A.add_origin('cube', lambda x: x * x * x, dt=net.dt, solver='eigh')
+
+    assert A.origin['X'].solver == 'cholesky'
+    assert A.origin['square'].solver == 'lstsq'
+    assert A.origin['cube'].solver == 'eigh'
+
+    # the decoders of each origin reconstruct its function
+    for name in ['X', 'square', 'cube']:
+        origin = A.origin[name]
+        activities = origin.compute_activities(
+            [0], origin.eval_points, net.dt)[0]
+        estimate = np.dot(activities.T, origin.decoders.get_value()[0])
+        error = estimate - origin.target_values.T
+        assert np.sqrt(np.mean(error ** 2)) < .1, name
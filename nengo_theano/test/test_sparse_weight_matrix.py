@@ -0,0 +1,51 @@
+"""This is a test file to test connecting neurons with a sparse weight
+matrix, checking that it runs the same as the dense weight matrix.
+"""
+
+import numpy as np
+import scipy.sparse
+
+from nengo_theano.test.common import make_network
+
+neurons = 50
+array_size = 2
+
+def make_net(sparse):
+    net = make_network('Sparse Weight Matrix Test', seed=40)
+    net.make_input('in', [.8, -.5])
+    net.make('A', neurons=neurons, dimensions=1, array_size=array_size)
+    net.make('B', neurons=neurons, dimensions=1, array_size=array_size)
+    net.make('C', neurons=neurons, dimensions=1, array_size=array_size)
+
+    # 10% dense connectivity, the same for both networks
+    rng = np.random.RandomState(41)
+    shape = (array_size * neurons, array_size * neurons)
+    weight_matrix = rng.uniform(-.01, .01, size=shape) * \
+        (rng.uniform(size=shape) < .1)
+    # the same weights for every post array
+    shared_weights = weight_matrix[:neurons]
+    if sparse: 
+        weight_matrix = scipy.sparse.csr_matrix(weight_matrix)
+        shared_weights = scipy.sparse.coo_matrix(shared_weights)
+
+    net.connect('in', 'A')
+    net.connect_neurons('A', 'B', weight_matrix=weight_matrix)
+    net.connect_neurons('A', 'C', weight_matrix=shared_weights)
+
+    Bp = net.make_probe('B', dt_sample=.01, pstc=.01)
+    Cp = net.make_probe('C', dt_sample=.01, pstc=.01)
+    return net, Bp, Cp
+
+def test_sparse_weight_matrix():
+    # computing decoders draws from numpy's random number generator, so 
+    # make sure they're cached before making the networks to compare
+    make_net(False)
+
+    net, Bp, Cp = make_net(False)
+    net.run(.1)
+
+    net_sparse, Bp_sparse, Cp_sparse = make_net(True)
+    net_sparse.run(.1)
+
+    assert np.allclose(Bp_sparse.get_data(), Bp.get_data(), atol=1e-4)
+    assert np.allclose(Cp_sparse.get_data(), Cp.get_data(), atol=1e-4)
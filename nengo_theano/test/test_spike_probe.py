@@ -0,0 +1,69 @@
+"""This is a test file to test the bit-packed storage of spike probes,
+checking that the packed rasters unpack to the recorded spikes, and that
+no spike is dropped when sampling more coarsely than the time step, and
+that the output of rate neurons is recorded as it is.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_spike_probe():
+    net = nef.Network('Spike Probe Test')
+    net.make_input('in', np.sin)
+    net.make('A', 20, 1, array_size=2)
+    net.connect('in', 'A')
+
+    Ap = net.make_probe('A', data_type='spikes', dt_sample=.001)
+    Ap_coarse = net.make_probe('A', data_type='spikes', dt_sample=.005)
+
+    net.run(.2)
+    spikes = Ap.get_data()
+    assert spikes.shape == (200, 2, 20)
+    assert spikes.any()
+    # eight neurons to a byte
+    assert Ap.data.dtype == np.uint8
+    assert Ap.get_packed()[1].shape == (200, 5)
+
+    # each coarse sample holds every spike since the last one
+    coarse = Ap_coarse.get_data()
+    assert coarse.shape == (40, 2, 20)
+    index = np.floor(np.arange(200) * .001 / .005).astype(int)
+    for i in range(40):
+        assert np.all(coarse[i] == spikes[index == i].max(axis=0))
+
+    # the events and spike times match the raster
+    samples, neurons = Ap.get_events(chunk_size=7)
+    flat = spikes.reshape(200, 40)
+    assert np.all(flat[samples, neurons] == 1)
+    assert len(samples) == flat.sum()
+    times = Ap.get_spike_times()
+    assert len(times) == 40
+    for neuron, t in enumerate(times):
+        assert np.allclose(t, np.nonzero(flat[:, neuron])[0] * .001)
+
+def test_rate_probe():
+    net = nef.Network('Rate Probe Test')
+    net.make_input('in', np.sin)
+    net.make('A', 20, 1, neuron_type='lif-rate')
+    net.connect('in', 'A')
+
+    # the firing rates of rate neurons are recorded as they are
+    Ap = net.make_probe('A', data_type='spikes', dt_sample=.001)
+    assert not isinstance(Ap, nef.probe.SpikeProbe)
+
+    net.run(.1)
+    rates = Ap.get_data()
+    assert rates.shape == (100, 1, 20)
+    assert np.all(rates >= 0) and rates.max() > 1
+
+    # spikes aren't filtered, and can't be streamed
+    net.make('B', 20, 1)
+    for name, kwargs in [('A', dict(pstc=.01)), ('B', dict(pstc=.01)),
+                         ('B', dict(stream_dir='spikes'))]:
+        try:
+            net.make_probe(name, data_type='spikes', **kwargs)
+        except Exception:
+            pass
+        else:
+            assert False
@@ -0,0 +1,77 @@
+"""This is a test file to test caching the compiled theano_tick function,
+checking that a network loading its function from the cache runs the
+same as the network that compiled it.
+"""
+
+import os
+
+import numpy as np
+import theano
+
+from nengo_theano import cache
+from nengo_theano.test.common import make_network
+
+def make_net():
+    net = make_network('Tick Cache Test', seed=20, tick_cache=True)
+    net.make_input('in', [.5, -.3])
+    net.make('A', neurons=50, dimensions=2)
+    net.make('B', neurons=50, dimensions=2, noise=1)
+
+    net.connect('in', 'A')
+    net.connect('A', 'B')
+
+    Bp = net.make_probe('B', dt_sample=.01, pstc=.01)
+    return net, Bp
+
+def test_tick_cache():
+    # computing decoders draws from numpy's random number generator, so 
+    # make sure they're cached before making the networks to compare
+    make_net()
+
+    net, Bp = make_net()
+    net.run(.2)
+
+    net_cached, Bp_cached = make_net()
+    net_cached.run(.2)
+
+    assert np.allclose(Bp_cached.get_data(), Bp.get_data())
+
+    # building the graph again draws new noise streams, so only
+    # check that the function is in the cache after running
+    updates = net_cached.make_updates()
+    key = cache.generate_graph_key(updates)
+    assert os.path.exists(os.path.join(cache.tick_cache_dir, key + '.pkl'))
+    # only the current user can write the pickles
+    assert not os.stat(cache.tick_cache_dir).st_mode & 0o022
+
+    # loading the function from the cache doesn't optimize it again
+    optimize = theano.gof.opt.Optimizer.optimize
+    optimized = []
+    def counting_optimize(self, *args, **kwargs):
+        optimized.append(self)
+        return optimize(self, *args, **kwargs)
+    theano.gof.opt.Optimizer.optimize = counting_optimize
+    try:
+        assert cache.get_theano_tick(key, updates) is not None
+    finally:
+        theano.gof.opt.Optimizer.optimize = optimize
+    assert optimized == []
+
+def test_tick_cache_errors():
+    key = cache.generate_key('test_tick_cache_errors')
+    path = os.path.join(cache.tick_cache_dir, key + '.pkl')
+
+    # a pickle that can't be loaded anymore is recompiled
+    assert cache.is_private_dir(cache.tick_cache_dir)
+    with open(path, 'wb') as f:
+        f.write('cnengo_theano.cache\nno_such_function\n.')
+    assert cache.get_theano_tick(key, {}) is None
+
+    # the pickles are evicted when they don't fit
+    max_tick_cache_size = cache.max_tick_cache_size
+    try:
+        cache.max_tick_cache_size = 0
+        cache.set_theano_tick(key, None)
+        assert not os.path.exists(path)
+    finally:
+        cache.max_tick_cache_size = max_tick_cache_size
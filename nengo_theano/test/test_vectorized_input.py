@@ -0,0 +1,29 @@
+"""This is a test file to test function inputs evaluated for the whole
+run before it starts, checking that they match the same function called
+from python every time step.
+"""
+
+import numpy as np
+
+import nengo_theano as nef
+
+def test_vectorized_input():
+    func = lambda t: [np.sin(10 * t), np.cos(10 * t)]
+    vfunc = lambda t: np.array([np.sin(10 * t), np.cos(10 * t)]).T
+
+    net = nef.Network('Vectorized Input Test')
+    net.make_input('in', func, zero_after_time=.1505)
+    net.make_input('vin', vfunc, zero_after_time=.1505, vectorized=True)
+
+    # only the function called every time step needs ticking
+    assert [node.name for node in net.tick_nodes] == ['in']
+
+    Ip = net.make_probe('in', dt_sample=.001, pstc=0)
+    Vp = net.make_probe('vin', dt_sample=.001, pstc=0)
+
+    net.run(.1)
+    # the function is evaluated one step past the end of the run
+    assert len(net.get_object('vin').table.get_value()) == 102
+    net.run(.1)
+    assert np.allclose(Vp.get_data(), Ip.get_data(), atol=1e-6)
+    assert np.all(Vp.get_data()[-40:] == 0)